@@ -8,10 +8,13 @@ import time
 import math
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import app.ui as ui
-from app.plot import Plot
+from app.plot import CAMERA_ORIGIN, Plot
+from robot.differential_ik import DifferentialIK
 from robot.robot import Robot
+from robot.trajectory import CommandedPose, TrajectoryPlanner, stream_trajectory
 from robot.triangulation import Triangulation as Tri
 import numpy as np
+from ws.latency import pipeline_latency
 
 
 # COLUMNS_TEXT PROB NOT NEEDED
@@ -19,7 +22,7 @@ COLUMNS_TEXT = ("Id", "Voltage", "Current", "Temperature", "Position", "Load")
 COLUMNS_HEADER = ["Id", "Voltage", "Current", "Temperature", "Position", "Load"]
 
 class App:
-    def __init__(self, between_cameras, camera_mode_width, camera_mode_height, database, ws) -> None:
+    def __init__(self, between_cameras, camera_mode_width, camera_mode_height, database, ws, workspace=None) -> None:
         ########################
         ############## GUI CONST
         ctk.set_appearance_mode("dark")  # Set dark mode
@@ -46,11 +49,16 @@ class App:
         }
 
         self.points = None
+        self.points_time = None  # time.perf_counter() of the last detection that gave self.points
 
         ########################
         ################ OBJECTS
         self.plot = Plot()
-        self.robot = Robot()
+        self.robot = Robot(workspace)
+        self.planner = TrajectoryPlanner()
+        self.motion_task = None
+        self.commanded = CommandedPose()  # Last pose sent to the arm, where the next move starts
+        self.tracking_task = None
         self.triangulation = Tri()
 
         ########################
@@ -88,6 +96,7 @@ class App:
         self.entry_z = ui.text_gap(self.camera_frame, 150, 2, 0, 25, 10 ,"e")
 
         btn_compute = ui.button(self.camera_frame,"Oblicz", None, self.update_robot, 5, 0, 10, 10)
+        btn_track = ui.button(self.camera_frame,"Śledź", None, self.toggle_tracking, 6, 0, 10, 10)
         #################################
         ########## data
         self.table = ui.table(self.data_frame, COLUMNS_TEXT, "headings", COLUMNS_HEADER, 160, 6, 16, 20, 20, 'nsew')
@@ -163,20 +172,22 @@ class App:
 
     def update_camera_frames(self, frame0, frame1):
         """Update the GUI with new camera frames."""
-        # Resize frames to fit in the GUI
-        frame0_resized = cv2.resize(frame0, (self.camera_mode_width, self.camera_mode_height))
-        frame1_resized = cv2.resize(frame1, (self.camera_mode_width, self.camera_mode_height))
+        with pipeline_latency.measure("gui_conversion"):
+            # Resize frames to fit in the GUI
+            frame0_resized = cv2.resize(frame0, (self.camera_mode_width, self.camera_mode_height))
+            frame1_resized = cv2.resize(frame1, (self.camera_mode_width, self.camera_mode_height))
 
-        # Convert frames to ImageTk format
-        frame0_image = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame0_resized, cv2.COLOR_BGR2RGB)))
-        frame1_image = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame1_resized, cv2.COLOR_BGR2RGB)))
+            # Convert frames to ImageTk format
+            frame0_image = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame0_resized, cv2.COLOR_BGR2RGB)))
+            frame1_image = ImageTk.PhotoImage(image=Image.fromarray(cv2.cvtColor(frame1_resized, cv2.COLOR_BGR2RGB)))
 
-        # Update labels with new images
-        self.camera0_label.configure(image=frame0_image)
-        self.camera0_label.image = frame0_image  # Keep a reference to prevent garbage collection
+        with pipeline_latency.measure("display"):
+            # Update labels with new images
+            self.camera0_label.configure(image=frame0_image)
+            self.camera0_label.image = frame0_image  # Keep a reference to prevent garbage collection
 
-        self.camera1_label.configure(image=frame1_image)
-        self.camera1_label.image = frame1_image  # Keep a reference to prevent garbage collection
+            self.camera1_label.configure(image=frame1_image)
+            self.camera1_label.image = frame1_image  # Keep a reference to prevent garbage collection
 
     def triangulation_operation(self):
         """Perform triangulation to calculate 3D position from detections"""
@@ -188,6 +199,8 @@ class App:
         obj1 = self.get_detection_from_yolo(1)
         
         if not obj0 or not obj1:
+            # Lost the object, nothing must keep following the old position
+            self.points = None
             return None
             
         # Scale the detection coordinates
@@ -207,16 +220,18 @@ class App:
 
         # Calculate 3D position using triangulation
         self.points = self.triangulation.get_3d_position(obj0, obj1)
+        if self.points is not None:
+            self.points_time = time.perf_counter()
         return self.points
     
     def get_detection_from_yolo(self, camera_index):
         """Get detection information from YOLO for a specific camera"""
-        from camera.detection import yolo, yolo1
+        from camera.detection import get_detector
         
-        if camera_index == 0:
-            return yolo.get_detections_info()
-        else:
-            return yolo1.get_detections_info()
+        detector = get_detector()
+        if detector is None:
+            return []
+        return detector.get_detections_info(camera_index)
     
     async def update_camera_visualization(self):
         """Update the 3D visualization based on camera triangulation"""
@@ -247,15 +262,141 @@ class App:
             await asyncio.sleep(0.25)
 
     def update_robot(self):
-        theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4 = self.robot.update_robot(self.entry_x.get(), self.entry_y.get(), self.entry_z.get())
+        try:
+            theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4 = self.robot.update_robot(self.entry_x.get(), self.entry_y.get(), self.entry_z.get())
+        except ValueError as e:
+            # Nothing is plotted or sent for a target without a valid solution
+            self.label_coord.configure(text=f"No valid IK solution:\n{e}")
+            return
 
         self.plot.plot_robot(self.robot, theta1, theta2, theta3, theta4)
-        self.communicator.move_to_position(pos1, pos2, pos3, pos4, self.offset_1, self.offset_2, self.offset_3, self.offset_4)
+        self.move_to((self.entry_x.get(), self.entry_y.get(), self.entry_z.get()),
+                     (theta1, theta2, theta3, theta4), (pos1, pos2, pos3, pos4))
 
         self.label_coord.configure(text=f"End-Effector Coordinates:\nX: {self.robot.rx:.2f} \nY: {self.robot.ry:.2f} \nZ: {self.robot.rz:.2f}")
-        self.update_table()
         self.plot.fig.canvas.draw_idle()
 
+    def toggle_tracking(self):
+        """Start or stop following the triangulated object"""
+        if self.tracking_task and not self.tracking_task.done():
+            self.tracking_task.cancel()
+            return
+        if self.motion_task and not self.motion_task.done():
+            self.motion_task.cancel()
+        self.tracking_task = asyncio.ensure_future(self.track_object())
+
+    def stop_tracking(self):
+        """Stop following the object, so a manual move is the only thing commanding the arm"""
+        if self.tracking_task and not self.tracking_task.done():
+            self.tracking_task.cancel()
+            print("[i] Tracking stopped for a manual move")
+
+    async def track_object(self, rate=200.0, gain=0.5, tolerance=1.0, max_age=1.0):
+        """
+        Follow the triangulated object with differential IK, correcting the joints a small
+        step every tick instead of re-solving the pose, starting from the last commanded pose.
+        The arm holds its position while the object is outside the workspace or within
+        tolerance. Stops when cancelled, or when no detection has arrived for max_age.
+
+        Args:
+            rate (float): Control rate in Hz
+            gain (float): Fraction of the remaining error corrected per tick
+            tolerance (float): Position error in mm below which the joints are left alone
+            max_age (float): Time in seconds without a detection after which tracking stops
+        """
+        links = {"a2": self.robot.a2, "a3": self.robot.a3, "a4": self.robot.a4}
+        ik = DifferentialIK(self.commanded.angles, **links)
+        last_steps = None
+        out_of_reach = False
+        t_start = time.perf_counter()
+        while True:
+            await asyncio.sleep(1.0 / rate)
+            # Triangulation refreshes the target a few times a second, an older one is a lost object
+            t_detected = max(self.points_time or t_start, t_start)
+            if time.perf_counter() - t_detected > max_age:
+                print(f"[-] No detection for {max_age:.1f} s, tracking stopped")
+                return
+            if self.points is None:
+                continue
+            target = np.asarray(CAMERA_ORIGIN) + np.asarray(self.points) * 1000
+
+            # Hold the last position instead of stretching towards an unreachable object
+            reachable = self.robot.is_reachable(*target)
+            if reachable == out_of_reach:
+                out_of_reach = not reachable
+                print("[-] Tracked object outside the workspace, holding" if out_of_reach
+                      else "[+] Tracked object back in the workspace")
+            if out_of_reach:
+                continue
+
+            # Close enough already, don't chase camera noise
+            if np.linalg.norm(target - ik.position) <= tolerance:
+                continue
+
+            steps, error, accepted = ik.step(target, gain)
+            steps = tuple(steps.tolist())
+            # A rejected step keeps the old joint state, so there is nothing new to send
+            if accepted and steps != last_steps:
+                self.send_joint_positions(steps)
+                self.commanded.update(ik.position, ik.angles)
+                last_steps = steps
+
+    def move_to(self, target, angles, positions):
+        """
+        Move to a target along a planned straight line from the last commanded pose,
+        streaming the steps in the background. Tracking is stopped first, and a move still
+        streaming is cancelled and the new one starts from the last waypoint it sent. Jumps straight to positions, the
+        target's valid IK solution with joint angles angles, when nothing was commanded
+        yet or there is no plan.
+        """
+        try:
+            target = tuple(float(value) for value in target)
+        except ValueError as e:
+            # Nothing valid to move to, keep the current motion and show why
+            self.label_coord.configure(text=f"No valid IK solution:\n{e}")
+            return
+
+        self.stop_tracking()
+        if self.motion_task and not self.motion_task.done():
+            self.motion_task.cancel()
+
+        trajectory = None
+        if self.commanded.point is not None:
+            try:
+                trajectory = self.planner.plan((self.commanded.point, target))
+            except ValueError as e:
+                print(f"[-] Trajectory planning failed, moving directly: {e}")
+
+        if trajectory is None:
+            self.send_joint_positions(positions)
+            self.commanded.update(target, angles)
+            return
+        self.motion_task = asyncio.ensure_future(
+            stream_trajectory(trajectory, self.send_joint_positions, self.commanded))
+
+    def update_table(self, telemetry):
+        """Show servo telemetry (a ws.protocol.TELEMETRY_DTYPE record array) in the data table"""
+        for record in telemetry:
+            servo_id = int(record['id'])
+            self.table.insert_or_update(servo_id, (
+                servo_id,
+                f"{record['voltage']:.2f}",
+                f"{record['current']:.2f}",
+                f"{record['temperature']:.1f}",
+                int(record['position']),
+                f"{record['load']:.2f}",
+            ))
+
+    def send_joint_positions(self, positions):
+        """Send step positions for joints 1-4, each replacing an unsent older target for the same servo"""
+        if not self.ws_client:
+            print("WebSocket client not initialized.")
+            return
+        for joint, pos in enumerate(positions):
+            servo_id = joint + 1
+            offset = int(self.database.get("offset", joint) or 0) if self.database else 0
+            self.ws_client.send_servo_command('msg-servo-st', servo_id, int(pos) + offset)
+
     
     
 
@@ -7,6 +7,8 @@ from robot.matrices import *
 a3 = 152.794
 a4 = 157.76
 a5 = 90
+# Position of the left camera in the robot frame in mm, triangulated points are in metres relative to it
+CAMERA_ORIGIN = [121, -30, 70]
 
 class Plot:
     def __init__(self) -> None:
@@ -40,7 +42,7 @@ class Plot:
 
     def plot_camera(self, x, y, z):
         cord = [x, y, z]
-        w_p = [121, -30, 70]
+        w_p = CAMERA_ORIGIN
 
         # Rysujemy punkt i zapisujemy referencję do niego
         camera_point = self.ax.scatter(
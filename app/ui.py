@@ -1,7 +1,6 @@
 import customtkinter as ctk
 import tkinter as ttk
 from tkinter import ttk
-import asyncio
 
 class button:
     def __init__(self, window, text_var=None, textvariable_var=None, command_var=None, row=0, column=0, padx=0, pady=0, sticky='nsew', color=None):
@@ -277,14 +276,14 @@ class slider:
             if slider.selected_slider:
                 id = slider.selected_slider.id_number
                 data = slider.selected_slider.slider.get()
-                msg = None
+                pin = None
                 if id == 0:
-                    msg = ['msg-servo-9g',f"*2,{int(data)},{self.step_delay},{self.step_size}*"]
+                    pin = 2
                 elif id == 1:
-                    msg = ['msg-servo-9g',f"*5,{int(data)},{self.step_delay},{self.step_size}*"]
-                if msg:
-                    print(msg)
-                    asyncio.create_task(ws.send_queue.put(msg))
+                    pin = 5
+                if pin is not None:
+                    # Replaces a command for this servo that hasn't been sent yet
+                    ws.send_servo_command('msg-servo-9g', pin, int(data), self.step_delay, self.step_size)
 
     def get(self):
         return self.slider.get()
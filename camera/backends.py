@@ -0,0 +1,192 @@
+import os
+import glob
+import cv2
+import numpy as np
+
+# Inference backends supported by YOLODetector
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+def _is_up_to_date(exported_path, source_path):
+    """Check whether an exported model exists and is newer than the source weights"""
+    return os.path.exists(exported_path) and os.path.getmtime(exported_path) >= os.path.getmtime(source_path)
+
+
+def _extract_recording(recording_path, limit=300):
+    """
+    Decode and undistort frames from a SAVE_FRAMES recording into a directory of JPEGs,
+    so calibration sees the same images as the detector.
+
+    Args:
+        recording_path (str): Recording written by ws.recording.FrameRecorder
+        limit (int): Maximum number of stereo pairs to extract
+
+    Returns:
+        str: Directory with the extracted frames
+    """
+    from camera.distortion import distortion
+    from ws.frame_processor import parse_frame_data
+    from ws.recording import FrameRecording
+
+    out_dir = f"{os.path.splitext(recording_path)[0]}_calibration"
+    if os.path.isdir(out_dir) and glob.glob(os.path.join(out_dir, "*.jpg")):
+        return out_dir
+    os.makedirs(out_dir, exist_ok=True)
+
+    recording = FrameRecording(recording_path)
+    step = max(1, len(recording) // limit)
+    for i in range(0, len(recording), step):
+        payloads = parse_frame_data(recording[i][1])
+        if payloads is None:
+            continue
+        frames = [cv2.imdecode(np.frombuffer(img, dtype=np.uint8), cv2.IMREAD_COLOR) for img in payloads]
+        if frames[0] is None or frames[1] is None:
+            continue
+        for camera_index, frame in enumerate(distortion(*frames)):
+            cv2.imwrite(os.path.join(out_dir, f"camera{camera_index}_{i:06d}.jpg"), frame)
+    recording.close()
+    return out_dir
+
+
+def _calibration_images(calibration_dir, limit=300):
+    """
+    List frames saved with SAVE_FRAMES to use for INT8 calibration.
+
+    Args:
+        calibration_dir (str): Directory with saved frames, searched recursively,
+            or a recording file whose frames are extracted first
+        limit (int): Maximum number of frames to use
+
+    Returns:
+        list: Paths to calibration images
+    """
+    if calibration_dir and os.path.isfile(calibration_dir):
+        calibration_dir = _extract_recording(calibration_dir, limit)
+    if not calibration_dir or not os.path.isdir(calibration_dir):
+        raise ValueError(f"Calibration directory not found: {calibration_dir}")
+
+    paths = sorted(glob.glob(os.path.join(calibration_dir, "**", "*.jpg"), recursive=True))
+    if not paths:
+        raise ValueError(f"No calibration frames in: {calibration_dir}")
+
+    # Spread the sample over the whole recording
+    step = max(1, len(paths) // limit)
+    return paths[::step][:limit]
+
+
+def _preprocess(frame, imgW, imgH):
+    """Convert a BGR frame to the NCHW float32 tensor layout the exported model expects"""
+    resized = cv2.resize(frame, (imgW, imgH))
+    rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    return np.ascontiguousarray(rgb.transpose(2, 0, 1)[np.newaxis], dtype=np.float32) / 255.0
+
+
+def _write_calibration_yaml(calibration_dir, names):
+    """
+    Write a dataset description pointing at the saved frames, as required by the
+    ultralytics OpenVINO INT8 export.
+
+    Returns:
+        str: Path to the dataset yaml
+    """
+    yaml_path = os.path.join(calibration_dir, "calibration.yaml")
+    with open(yaml_path, "w") as f:
+        f.write(f"path: {os.path.abspath(calibration_dir)}\n")
+        f.write("train: .\n")
+        f.write("val: .\n")
+        f.write("names:\n")
+        for idx, name in names.items():
+            f.write(f"  {idx}: {name}\n")
+    return yaml_path
+
+
+def _quantize_onnx(onnx_path, int8_path, calibration_dir, imgW, imgH):
+    """
+    Post-training static INT8 quantisation of an ONNX model with ONNX Runtime.
+
+    Args:
+        onnx_path (str): FP32 ONNX model
+        int8_path (str): Output path for the quantised model
+        calibration_dir (str): Recording or directory of frames saved with SAVE_FRAMES
+        imgW (int): Model input width
+        imgH (int): Model input height
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+
+    input_name = onnx.load(onnx_path, load_external_data=False).graph.input[0].name
+    paths = _calibration_images(calibration_dir)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(paths)
+
+        def get_next(self):
+            for path in self.paths:
+                frame = cv2.imread(path)
+                if frame is not None:
+                    return {input_name: _preprocess(frame, imgW, imgH)}
+            return None
+
+    print(f"[+] Calibrating INT8 model on {len(paths)} frames from {calibration_dir}")
+    quantize_static(onnx_path, int8_path, FrameReader(),
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # Keep the ultralytics metadata (class names, stride, imgsz) on the quantised model
+    source = onnx.load(onnx_path, load_external_data=False)
+    quantized = onnx.load(int8_path)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, int8_path)
+
+
+def export_model(model_path, backend, imgW=480, imgH=480, int8=False, calibration_dir=None):
+    """
+    Export a PyTorch YOLO model for a CPU inference backend, reusing a previous export
+    if it is newer than the weights.
+
+    Args:
+        model_path (str): Path to the .pt model
+        backend (str): One of BACKENDS
+        imgW (int): Model input width
+        imgH (int): Model input height
+        int8 (bool): Apply post-training INT8 quantisation
+        calibration_dir (str): Recording or directory of frames saved with SAVE_FRAMES, required for int8
+
+    Returns:
+        str: Path that YOLO() can load for the requested backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend == "torch":
+        return model_path
+
+    from ultralytics import YOLO
+
+    stem = os.path.splitext(model_path)[0]
+    if backend == "onnx":
+        onnx_path = f"{stem}.onnx"
+        if not _is_up_to_date(onnx_path, model_path):
+            print(f"[+] Exporting {model_path} to ONNX")
+            onnx_path = YOLO(model_path).export(format="onnx", imgsz=(imgH, imgW), dynamic=True, simplify=True)
+        if not int8:
+            return onnx_path
+
+        int8_path = f"{stem}_int8.onnx"
+        if not _is_up_to_date(int8_path, onnx_path):
+            _quantize_onnx(onnx_path, int8_path, calibration_dir, imgW, imgH)
+        return int8_path
+
+    # ultralytics names the OpenVINO export directory after the model and precision
+    export_dir = f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    if not _is_up_to_date(export_dir, model_path):
+        print(f"[+] Exporting {model_path} to OpenVINO{' INT8' if int8 else ''}")
+        model = YOLO(model_path)
+        export_args = {"format": "openvino", "imgsz": (imgH, imgW), "dynamic": True}
+        if int8:
+            if calibration_dir and os.path.isfile(calibration_dir):
+                calibration_dir = _extract_recording(calibration_dir)
+            _calibration_images(calibration_dir)
+            export_args.update(int8=True, data=_write_calibration_yaml(calibration_dir, model.names))
+        export_dir = model.export(**export_args)
+    return export_dir
@@ -2,15 +2,18 @@ import os
 import time
 import cv2
 import numpy as np
+import threading
 from collections import deque
-import torch
-from ultralytics import YOLO
-
+from camera.backends import export_model
+from ws.latency import pipeline_latency
 
+# Default model shared by both stereo cameras
+DEFAULT_MODEL = "my_model.pt"
 
 
 class YOLODetector:
-    def __init__(self, model_fn, min_conf_threshold=0.25, imgW=480, imgH=480):
+    def __init__(self, model_fn, min_conf_threshold=0.25, imgW=480, imgH=480, num_cameras=1, top_k=1,
+                 backend="torch", int8=False, calibration_dir=None):
         """
         Initialize YOLO detector with GPU support
         
@@ -19,6 +22,11 @@ class YOLODetector:
             min_conf_threshold: minimum confidence threshold for detections
             imgW: width to resize input frame to
             imgH: height to resize input frame to
+            num_cameras: number of cameras whose frames are batched together
+            top_k: maximum number of detections kept per frame, 1 keeps only the most confident one
+            backend: inference backend, "torch", "onnx" (ONNX Runtime) or "openvino"
+            int8: use a post-training INT8 quantised model (onnx/openvino only)
+            calibration_dir: recording or directory of frames saved with SAVE_FRAMES, used for INT8 calibration
         """
         # Set path to model
         cwd = os.getcwd()
@@ -28,20 +36,33 @@ class YOLODetector:
         self.imgW = imgW
         self.imgH = imgH
         self.min_conf_threshold = min_conf_threshold
+        self.num_cameras = num_cameras
+        self.top_k = top_k
+        self.backend = backend
         
         # Set up buffer for frame rate calculation
         self.frame_rate_calcs = deque([], maxlen=100)
         self.frame_rate_avg = 0
         self.detections_info = []
-        self.detections_online = []
+        self.detections_online = [[] for _ in range(num_cameras)]
+        self.detections_selected = [np.empty((0, 6), dtype=np.float32) for _ in range(num_cameras)]
+        # torch and ultralytics are imported here so that importing this module stays cheap
+        import torch
+        from ultralytics import YOLO
+        
         # Check for CUDA availability
         self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
         print(f"Using device: {self.device}")
         
+        # Export the model for a CPU backend if requested, outputs stay the same
+        if backend != "torch":
+            self.model_path = export_model(self.model_path, backend, imgW, imgH, int8, calibration_dir)
+            print(f"Using {backend} backend: {self.model_path}")
+        
         # Load model and labels with GPU support
-        self.model = YOLO(self.model_path)  # pretrained YOLOv8 model
+        self.model = YOLO(self.model_path, task="detect")  # pretrained YOLOv8 model
         # Explicitly set the model to use GPU
-        if torch.cuda.is_available():
+        if backend == "torch" and torch.cuda.is_available():
             self.model.to(self.device)
         self.labels = self.model.names
         
@@ -50,77 +71,125 @@ class YOLODetector:
                           (79,161,89), (72,201,237), (161,122,176), (167,157,255), 
                           (95,117,156), (175,176,186)]
     
-    def process_frame(self, frame):
+    def process_frames(self, frames):
         """
-        Process a single frame with YOLO detection - limited to detecting only one object
-        with the highest confidence score
+        Process frames from several cameras with a single batched YOLO forward pass -
+        limited to the top_k objects per camera with the highest confidence score
         
         Args:
-            frame: input frame to process
+            frames: list of input frames, one per camera
             
         Returns:
-            processed_frame: frame with detection results drawn
-            detections_info: list containing at most one detection with the highest confidence
+            processed_frames: list of frames with detection results drawn (None for missing input)
         """
-        if frame is None or len(frame) == 0:
-            return None, []
+        processed_frames = [None] * len(frames)
+        valid = [i for i, frame in enumerate(frames) if frame is not None and len(frame) > 0]
+        if not valid:
+            return processed_frames
         
         # Start timer for calculating framerate
         t_start = time.perf_counter()
         
-        # Resize frame
-        resized_frame = cv2.resize(frame, (self.imgW, self.imgH))
+        # Resize frames
+        resized_frames = [cv2.resize(frames[i], (self.imgW, self.imgH)) for i in valid]
         
-        # Run inference on GPU
-        results = self.model(resized_frame, verbose=False, device=self.device)
-        detections = results[0].boxes
+        # Run inference on the whole batch at once
+        with pipeline_latency.measure("inference"):
+            results = self.model(resized_frames, verbose=False, device=self.device)
         
-        # Create a copy of the frame to draw on
-        processed_frame = resized_frame.copy()
+        with pipeline_latency.measure("annotation"):
+            for camera_index, resized_frame, result in zip(valid, resized_frames, results):
+                processed_frames[camera_index] = self._draw_detections(camera_index, resized_frame, result.boxes)
         
-        # Store detection information
+        # Calculate FPS
+        t_stop = time.perf_counter()
+        t_total = t_stop - t_start
+        self.frame_rate_calcs.appendleft(1/t_total)
+        self.frame_rate_avg = np.mean(self.frame_rate_calcs)
         
+        return processed_frames
+    
+    def process_frame(self, frame, camera_index=0):
+        """
+        Process a single frame with YOLO detection
         
-        # Find the detection with highest confidence
-        best_detection = None
-        highest_conf = 0
+        Args:
+            frame: input frame to process
+            camera_index: camera the frame comes from
+            
+        Returns:
+            processed_frame: frame with detection results drawn
+        """
+        frames = [None] * self.num_cameras
+        frames[camera_index] = frame
+        return self.process_frames(frames)[camera_index]
+    
+    def select_detections(self, detections):
+        """
+        Select the most confident detections above the threshold with tensor operations
         
-        # Go through each detection
-        for i in range(len(detections)):
-            # Get bounding box confidence
-            conf = detections[i].conf.item()
+        Args:
+            detections: boxes returned by the model for one frame
             
-            # Check if this detection has higher confidence
-            if conf > highest_conf and conf > self.min_conf_threshold:
-                highest_conf = conf
-                best_detection = i
-        
-        # Process only the best detection if one was found
-        if best_detection is not None:
-            i = best_detection
+        Returns:
+            selected: float32 array of shape (K, 6) with rows (xmin, ymin, xmax, ymax, confidence, class_id),
+                sorted by confidence, K <= top_k
+        """
+        data = detections.data  # (N, 6) tensor: xyxy, conf, cls
+        if len(data) == 0:
+            return np.empty((0, 6), dtype=np.float32)
+        
+        conf = data[:, 4]
+        keep = conf > self.min_conf_threshold
+        
+        if self.top_k == 1:
+            if not bool(keep.any()):
+                return np.empty((0, 6), dtype=np.float32)
+            # Single host transfer of the winning row
+            best = (conf * keep).argmax()
+            return data[best:best + 1].cpu().numpy().astype(np.float32, copy=False)
+        
+        kept = data[keep]
+        order = kept[:, 4].argsort(descending=True)[:self.top_k]
+        return kept[order].cpu().numpy().astype(np.float32, copy=False)
+    
+    def _draw_detections(self, camera_index, resized_frame, detections):
+        """
+        Select the most confident detections and draw them on a copy of the frame
+        
+        Args:
+            camera_index: camera the frame comes from
+            resized_frame: frame passed to the model
+            detections: boxes returned by the model for this frame
             
-            # Get bounding box coordinates
-            xyxy_tensor = detections[i].xyxy.cpu()  # Move tensor to CPU for numpy conversion
-            xyxy = xyxy_tensor.numpy().squeeze()
-            xmin, ymin, xmax, ymax = xyxy.astype(int)
+        Returns:
+            processed_frame: frame with detection results drawn
+        """
+        # Create a copy of the frame to draw on
+        processed_frame = resized_frame.copy()
+        
+        selected = self.select_detections(detections)
+        self.detections_selected[camera_index] = selected
+        
+        for rank, row in enumerate(selected):
+            xmin, ymin, xmax, ymax = row[:4].astype(int)
+            conf = float(row[4])
             
             # Get bounding box class ID and name
-            classidx = int(detections[i].cls.item())
+            classidx = int(row[5])
             classname = self.labels[classidx]
             
-            # Get bounding box confidence
-            conf = detections[i].conf.item()
-            
-            # Store detection info
-            detection_info = {
-                'bbox': (xmin, ymin, xmax, ymax),
-                'class_id': classidx,
-                'class_name': classname,
-                'confidence': conf
-            }
-            self.detections_online = [xmin, ymin, xmax, ymax]   
+            # Store detection info for the best detection
+            if rank == 0:
+                detection_info = {
+                    'bbox': (xmin, ymin, xmax, ymax),
+                    'class_id': classidx,
+                    'class_name': classname,
+                    'confidence': conf
+                }
+                self.detections_online[camera_index] = [xmin, ymin, xmax, ymax]
 
-            self.detections_info.append(detection_info)
+                self.detections_info.append(detection_info)
             
             # Draw box
             color = self.bbox_colors[classidx % 10]
@@ -134,8 +203,8 @@ class YOLODetector:
             cv2.putText(processed_frame, label, (xmin, label_ymin-7), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
         
-        # Always set object count to 0 or 1
-        object_count = 1 if best_detection is not None else 0
+        # Object count is at most top_k
+        object_count = len(selected)
         
         # Add FPS and object count info
         cv2.putText(processed_frame, f'FPS: {self.frame_rate_avg:0.2f}', (10, 20), 
@@ -143,22 +212,129 @@ class YOLODetector:
         cv2.putText(processed_frame, f'Number of objects: {object_count}', (10, 40), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
         
-        # Calculate FPS
-        t_stop = time.perf_counter()
-        t_total = t_stop - t_start
-        self.frame_rate_calcs.appendleft(1/t_total)
-        self.frame_rate_avg = np.mean(self.frame_rate_calcs)
-        
         return processed_frame
     
-    def get_detections_info(self):
+    def get_detections_info(self, camera_index=0):
         """
         Get the detection information
         
+        Args:
+            camera_index: camera to get the latest detection for
+            
         Returns:
             detections_info: list containing detection information
         """
-        return self.detections_online
+        return self.detections_online[camera_index]
+    
+    def get_detections_array(self, camera_index=0):
+        """
+        Get the latest selected detections as a compact array
+        
+        Args:
+            camera_index: camera to get the detections for
+            
+        Returns:
+            selected: float32 array of shape (K, 6), see select_detections
+        """
+        return self.detections_selected[camera_index]
+
+
+class DetectorRegistry:
+    def __init__(self):
+        """
+        Registry of lazily loaded detectors.
+        
+        A detector is constructed in a background thread the first time it is requested,
+        so the GUI, WebSocket connection and kinematics don't wait for torch and the weights.
+        """
+        self._detectors = {}
+        self._errors = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+    
+    def preload(self, model_fn=DEFAULT_MODEL, **kwargs):
+        """
+        Start loading a detector in the background if it isn't loaded or loading already
+        
+        Args:
+            model_fn: path to YOLO model file
+            **kwargs: extra arguments passed to YOLODetector
+        """
+        with self._lock:
+            if model_fn in self._threads:
+                return
+            thread = threading.Thread(target=self._load, args=(model_fn, kwargs), daemon=True)
+            self._threads[model_fn] = thread
+        thread.start()
     
-yolo = YOLODetector(model_fn="my_model.pt")
-yolo1 = YOLODetector(model_fn="my_model.pt")
\ No newline at end of file
+    def _load(self, model_fn, kwargs):
+        """Construct the detector, runs in the loader thread"""
+        t_start = time.perf_counter()
+        try:
+            detector = YOLODetector(model_fn=model_fn, **kwargs)
+        except Exception as e:
+            print(f"[-] Failed to load model {model_fn}: {e}")
+            self._errors[model_fn] = e
+            return
+        self._detectors[model_fn] = detector
+        print(f"[+] Model {model_fn} loaded in {time.perf_counter() - t_start:.2f} s")
+    
+    def get(self, model_fn=DEFAULT_MODEL, wait=False, timeout=None, **kwargs):
+        """
+        Get a detector, starting the background load on first use
+        
+        Args:
+            model_fn: path to YOLO model file
+            wait: block until the detector is loaded
+            timeout: maximum time in seconds to wait when wait is True
+            **kwargs: extra arguments passed to YOLODetector on first use
+            
+        Returns:
+            detector: YOLODetector, or None if it is not ready yet or failed to load
+        """
+        detector = self._detectors.get(model_fn)
+        if detector is not None:
+            return detector
+        
+        self.preload(model_fn, **kwargs)
+        if wait:
+            self._threads[model_fn].join(timeout)
+        return self._detectors.get(model_fn)
+    
+    def is_ready(self, model_fn=DEFAULT_MODEL):
+        """Check whether a detector has finished loading"""
+        return model_fn in self._detectors
+    
+    def get_error(self, model_fn=DEFAULT_MODEL):
+        """Get the exception raised while loading a detector, if any"""
+        return self._errors.get(model_fn)
+
+
+# Detectors are loaded on first use, one detector is shared by both stereo cameras
+detectors = DetectorRegistry()
+
+# Options the stereo detector is constructed with
+detector_options = {"num_cameras": 2}
+
+
+def configure_detector(**options):
+    """
+    Set YOLODetector options (e.g. backend, int8, calibration_dir) for the stereo detector.
+    Must be called before the detector is first used.
+    """
+    if detectors.is_ready(DEFAULT_MODEL):
+        print("[-] Detector already loaded, options will not take effect")
+    detector_options.update(options)
+
+
+def get_detector(wait=False):
+    """
+    Get the stereo detector, both cameras are run through it as a single batch
+    
+    Args:
+        wait: block until the detector is loaded
+        
+    Returns:
+        detector: YOLODetector, or None while it is still loading
+    """
+    return detectors.get(DEFAULT_MODEL, wait=wait, **detector_options)
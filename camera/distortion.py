@@ -20,18 +20,76 @@ D2 = np.array([[ 0.08981312, -0.56558791,  0.00496143, -0.00749746,  1.08375072]
 newcameramtx1, roi1 = cv2.getOptimalNewCameraMatrix(K1, D1, (display_w, display_h), 1, (display_w, display_h))
 newcameramtx2, roi2 = cv2.getOptimalNewCameraMatrix(K2, D2, (display_w, display_h), 1, (display_w, display_h))
 
-def distortion(image0, image1):
-    # Undistort
-    undistorted0 = cv2.undistort(image0, K1, D1, None, newcameramtx1)
-    undistorted1 = cv2.undistort(image1, K2, D2, None, newcameramtx2)
+# Remap tables keyed on (K, D, resolution), built once and reused for every frame
+_remap_cache = {}
 
-    # Crop the image
-    x0, y0, w0, h0 = roi1
-    x1, y1, w1, h1 = roi2
 
-    undistorted0 = undistorted0[y0:y0 + h0, x0:x0 + w0]
-    undistorted1 = undistorted1[y1:y1 + h1, x1:x1 + w1]
+def undistort_maps(K, D, size):
+    """
+    Get the undistortion lookup tables for a camera, building them on first use.
 
-    return undistorted0, undistorted1
+    The tables are already cropped to the ROI returned by getOptimalNewCameraMatrix,
+    so cv2.remap writes straight into the cropped image.
+
+    Args:
+        K (np.ndarray): Camera intrinsic matrix (3x3)
+        D (np.ndarray): Distortion coefficients
+        size (tuple): Image size as (width, height)
+
+    Returns:
+        tuple: (map1, map2) fixed-point maps for cv2.remap
+    """
+    key = (K.tobytes(), D.tobytes(), size)
+    maps = _remap_cache.get(key)
+    if maps is None:
+        newcameramtx, roi = cv2.getOptimalNewCameraMatrix(K, D, size, 1, size)
+        map1, map2 = cv2.initUndistortRectifyMap(K, D, None, newcameramtx, size, cv2.CV_16SC2)
+
+        x, y, w, h = roi
+        if w > 0 and h > 0:
+            map1 = map1[y:y + h, x:x + w].copy()
+            map2 = map2[y:y + h, x:x + w].copy()
+
+        maps = (map1, map2)
+        _remap_cache[key] = maps
+    return maps
+
+
+def scaled_intrinsics(K, size):
+    """
+    Rescale a camera matrix calibrated at display_w x display_h to another resolution.
 
+    Args:
+        K (np.ndarray): Camera intrinsic matrix at full resolution
+        size (tuple): Target image size as (width, height)
 
+    Returns:
+        np.ndarray: Camera intrinsic matrix for the target resolution
+    """
+    w, h = size
+    if (w, h) == (display_w, display_h):
+        return K
+
+    sx = w / display_w
+    sy = h / display_h
+    scaled = K.copy()
+    scaled[0, 0] *= sx
+    scaled[0, 2] *= sx
+    scaled[1, 1] *= sy
+    scaled[1, 2] *= sy
+    return scaled
+
+
+def undistort(image, K, D):
+    """Undistort and crop a single frame using the cached remap tables"""
+    h, w = image.shape[:2]
+    map1, map2 = undistort_maps(scaled_intrinsics(K, (w, h)), D, (w, h))
+    return cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
+
+
+def distortion(image0, image1):
+    # Undistort and crop to roi1/roi2 in a single remap pass
+    undistorted0 = undistort(image0, K1, D1)
+    undistorted1 = undistort(image1, K2, D2)
+
+    return undistorted0, undistorted1
@@ -1,75 +1,111 @@
 import asyncio
+import os
 from app.gui import App
 from ws.frame_processor import FrameProcessor
 from ws.ws import WebSocketClient
 from database.database import Database
+from camera.detection import configure_detector
+from ws.recording import ReplaySource
+from ws.latency import pipeline_latency
+from ws.stream_control import StreamQualityController
+from robot.workspace import load_workspace
 
 # Configuration
-WEBSOCKET_URI = "ws://192.168.1.63:8765"
+# Set ROBOT_WS_URI=ws://localhost:8765 to run against the stand-in server (python -m server.stand_in_server)
+WEBSOCKET_URI = os.environ.get("ROBOT_WS_URI", "ws://192.168.1.63:8765")
+# Servo command encoding: "binary" (ws/protocol.py) or "text" for older firmware
+SERVO_PROTOCOL = "text"
+# Seconds to wait for the robot to acknowledge a servo command, None for firmware without acknowledgements
+SERVO_ACK_TIMEOUT = None
+SERVO_MAX_RETRIES = 1
 SAVE_FRAMES = False
+# Feed frames from a SAVE_FRAMES recording instead of the robot; speed None replays as fast as possible
+REPLAY_FILE = None
+REPLAY_SPEED = 1.0
+# Decode and undistort in worker processes to keep the GUI and WebSocket loop responsive
+DECODE_IN_PROCESSES = False
 CAMERA_WIDTH = 432
 CAMERA_HEIGHT = 768
+# Smallest frame size the detector (480x480) and the GUI preview need
+DECODE_TARGET_SIZE = (max(CAMERA_WIDTH, 480), max(CAMERA_HEIGHT, 480))
+# Inference backend: "torch", "onnx" or "openvino"; INT8 calibrates on frames saved with SAVE_FRAMES
+DETECTOR_BACKEND = "torch"
+DETECTOR_INT8 = False
+CALIBRATION_DIR = None
+# Ask the camera server for a cheaper stream when processing falls behind
+ADAPTIVE_STREAM = True
+# Reachable-workspace grid built with: python -m robot.workspace --out workspace
+WORKSPACE_DIR = "workspace"
 
 
 
 async def main():
     """Main application function that coordinates GUI and WebSocket communication"""
 
+    configure_detector(backend=DETECTOR_BACKEND, int8=DETECTOR_INT8, calibration_dir=CALIBRATION_DIR)
     
 
     # Initialize frame processor
-    frame_processor = FrameProcessor(save_frames=SAVE_FRAMES)
+    frame_processor = FrameProcessor(save_frames=SAVE_FRAMES, target_size=DECODE_TARGET_SIZE,
+                                     use_processes=DECODE_IN_PROCESSES)
     
-    # Store the last valid frames to handle cases when new processed frames aren't ready
-    last_valid_frames = (None, None)
+    # Sequence number of the pair currently on screen
+    shown_sequence = [0]
     
     # Create a callback function to handle incoming frames
     async def handle_frame_data(data):
-        nonlocal last_valid_frames
+        # Decode and process the incoming frames in the worker thread, waiting for this pair's result
+        result = await frame_processor.decode_and_process(data)
         
-        # Decode and process the incoming frames (this now happens in separate threads)
-        processed_frames = await frame_processor.decode_and_process(data)
-        
-        # Check if we got valid frames back
-        if processed_frames[0] is not None and processed_frames[1] is not None:
-            # Update our cached frames
-            last_valid_frames = processed_frames
-            
-            # Update the GUI with processed frames
-            app.update_camera_frames(processed_frames[0], processed_frames[1])
-        elif last_valid_frames[0] is not None and last_valid_frames[1] is not None:
-            # If no new frames are ready but we have previous ones, use those
-            app.update_camera_frames(last_valid_frames[0], last_valid_frames[1])
+        # A pair superseded by a newer one comes back empty, the newer pair's callback shows it
+        if result.frame0 is None or result.frame1 is None:
+            return
+        # Never replace a newer pair already on screen with an older one
+        if result.sequence <= shown_sequence[0]:
+            return
+        shown_sequence[0] = result.sequence
+        app.update_camera_frames(result.frame0, result.frame1)
     
     # Initialize WebSocket client with our frame handler
     ws_client = WebSocketClient(
         uri=WEBSOCKET_URI,
         frame_callback=handle_frame_data,
-        message_callback=lambda msg: print(f"Received message: {msg}")
+        message_callback=lambda msg: print(f"Received message: {msg}"),
+        protocol=SERVO_PROTOCOL,
+        ack_timeout=SERVO_ACK_TIMEOUT,
+        max_retries=SERVO_MAX_RETRIES,
+        telemetry_callback=lambda telemetry: app.update_table(telemetry)
     )
 
     db = Database()
     # Initialize the GUI app
-    app = App(between_cameras=0, camera_mode_width=CAMERA_WIDTH, camera_mode_height=CAMERA_HEIGHT, database=db, ws=ws_client)
-    
-
-    # Initialize frame processor
-    frame_processor = FrameProcessor(save_frames=SAVE_FRAMES)
+    app = App(between_cameras=0, camera_mode_width=CAMERA_WIDTH, camera_mode_height=CAMERA_HEIGHT, database=db, ws=ws_client,
+              workspace=load_workspace(WORKSPACE_DIR))
 
 
  # Store the database in the app for potential use    
     
+    # Frames come from the robot, or from a recording for offline runs
+    tasks = [app.run_async()]
+    if REPLAY_FILE:
+        tasks.append(ReplaySource(REPLAY_FILE, speed=REPLAY_SPEED).run(handle_frame_data))
+    else:
+        tasks.append(ws_client.run())
+        if ADAPTIVE_STREAM:
+            tasks.append(StreamQualityController(ws_client, frame_processor).run())
+    
     # Run all components concurrently
     try:
-        await asyncio.gather(
-            ws_client.run(),
-            app.run_async()
-        )
+        await asyncio.gather(*tasks)
     except KeyboardInterrupt:
         print("\n[+] Shutting down...")
     finally:
         # Ensure proper cleanup
         await ws_client.disconnect()
+        frame_processor.close()
+        pipeline_latency.dump()
+        if ws_client.command_tracker:
+            ws_client.command_tracker.dump()
 
 if __name__ == "__main__":
     # Run the main function
@@ -0,0 +1,105 @@
+import numpy as np
+from robot.kinematics import MIN_POS3, MIN_POS4, inverse_kinematics, joint_steps
+from robot.matrices import forward_kinematics_batch, jacobian_batch
+
+# Wrist pitch (theta2 + theta3 + theta4) of the closed-form solutions: end effector pointing straight down
+DOWN_PITCH = -np.pi / 2
+# Joint rows of the pitch task in the augmented Jacobian
+PITCH_ROW = np.array([0.0, 1.0, 1.0, 1.0])
+
+
+class DifferentialIK:
+    def __init__(self, angles=None, damping=5.0, max_step=0.05, pitch=DOWN_PITCH, pitch_weight=100.0,
+                 a2=152.794, a3=157.76, a4=90):
+        """
+        Damped least-squares differential IK for following a moving target.
+
+        Keeps the joint state between ticks and moves it a small step towards the target on
+        every tick, using the analytic Jacobian from robot.matrices. The 3D position task is
+        augmented with the wrist pitch, so the arm stays in the same family of poses as
+        inverse_kinematics and the 4x4 system stays well conditioned. One tick costs a few
+        small NumPy operations, so it runs at several hundred Hz on one core.
+
+        Args:
+            angles (array-like): Starting joint angles in radians, (theta1..theta4)
+            damping (float): Damping factor in mm, trades tracking speed for stability near singularities
+            max_step (float): Largest joint change per tick in radians
+            pitch (float): Wrist pitch to hold in radians
+            pitch_weight (float): Weight of the pitch task in mm per radian
+            a2 (float): Upper arm length
+            a3 (float): Forearm length
+            a4 (float): Wrist to end effector length
+        """
+        self.angles = np.array(angles if angles is not None else (np.pi, -np.pi / 2, 0.0, 0.0), dtype=np.float64)
+        self.damping = damping
+        self.max_step = max_step
+        self.pitch = pitch
+        self.pitch_weight = pitch_weight
+        self.a2 = a2
+        self.a3 = a3
+        self.a4 = a4
+        self.rejected_steps = 0
+
+    @classmethod
+    def from_target(cls, x, y, z, a2=152.794, a3=157.76, a4=90, **kwargs):
+        """Start from the closed-form solution for a target, solved with the same link lengths"""
+        theta1, theta2, theta3, theta4 = inverse_kinematics(x, y, z, a2, a3, a4)[:4]
+        return cls((theta1, theta2, theta3, theta4), a2=a2, a3=a3, a4=a4, **kwargs)
+
+    def reset(self, angles):
+        """Replace the joint state, e.g. with angles read back from the servos"""
+        self.angles = np.array(angles, dtype=np.float64)
+
+    @property
+    def position(self):
+        """Current end effector position in mm"""
+        end, points, above_ground = forward_kinematics_batch(self.angles, self.a2, self.a3, self.a4)
+        return end[0]
+
+    @property
+    def steps(self):
+        """Current servo step positions"""
+        return joint_steps(self.angles[np.newaxis])[0]
+
+    def step(self, target, gain=1.0):
+        """
+        Move the joint state one damped least-squares step towards a target.
+
+        A step that would put a link below the ground or a joint past its step limit is
+        rejected and the state is kept.
+
+        Args:
+            target (array-like): (x, y, z) in mm
+            gain (float): Fraction of the remaining error to correct in this tick
+
+        Returns:
+            tuple: (steps, error, accepted) - the 4 servo step positions, remaining position
+                error in mm and whether the step was applied
+        """
+        end, points, above_ground = forward_kinematics_batch(self.angles, self.a2, self.a3, self.a4)
+        error = np.empty(4)
+        error[:3] = gain * (np.asarray(target, dtype=np.float64) - end[0])
+        error[3] = gain * self.pitch_weight * (self.pitch - (self.angles[1] + self.angles[2] + self.angles[3]))
+
+        J = np.empty((4, 4))
+        J[:3] = jacobian_batch(self.angles, self.a2, self.a3, self.a4)[0]
+        J[3] = self.pitch_weight * PITCH_ROW
+
+        # dq = J^T (J J^T + damping^2 I)^-1 e
+        delta = J.T @ np.linalg.solve(J @ J.T + self.damping**2 * np.eye(4), error)
+        largest = np.abs(delta).max()
+        if largest > self.max_step:
+            delta *= self.max_step / largest
+
+        angles = self.angles + delta
+        new_end, new_points, new_above_ground = forward_kinematics_batch(angles, self.a2, self.a3, self.a4)
+        steps = joint_steps(angles[np.newaxis])[0]
+        if new_above_ground[0] and steps[2] >= MIN_POS3 and steps[3] >= MIN_POS4:
+            self.angles = angles
+            end = new_end
+            accepted = True
+        else:
+            self.rejected_steps += 1
+            steps = self.steps
+            accepted = False
+        return steps, float(np.linalg.norm(np.asarray(target, dtype=np.float64) - end[0])), accepted
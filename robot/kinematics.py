@@ -1,99 +1,191 @@
-import math
+from collections import OrderedDict
 import numpy as np
-from robot.matrices import compute_end_pos
+from robot.matrices import forward_kinematics_batch
 
+STEPS_PER_REVOLUTION = 4096
+# Servo steps per joint revolution relative to the servo, joint 2 is geared 54:28
+GEAR_RATIOS = np.array([1.0, 54 / 28, 1.0, 1.0])
+# Height of the shoulder joint above the base in mm
+SHOULDER_HEIGHT = 90
+# Lowest safe step positions of joints 3 and 4
+MIN_POS3 = 150
+MIN_POS4 = 1024
 
-def inverse_kinematics(x, y, z, a2=152.794, a3=157.76, a4=90):
-    valid_position = 1
-    z = z - 180
-    # Calculate theta1 based on x and y coordinates
-    if(z<0):
-        z = z * -1
-    elif(z>0):
-        z = z * -1
+# Bit flags explaining why a solution is invalid
+IK_OK = 0
+IK_OUT_OF_REACH = 1   # Target further than the arm can stretch (or too close to fold to)
+IK_BELOW_GROUND = 2   # A link point ends at or below z = 0
+IK_JOINT_LIMIT = 4    # Joint 3 or 4 below its minimum step position
 
-    theta1 = np.arctan2(y, x)  # This is correct
-    print("theta1:", theta1)
 
-    # Project the target point into the plane of the second and third joints
-    nx = np.sqrt(x**2 + y**2)
-    ny = z - 90
+def joint_steps(angles):
+    """
+    Convert joint angles to servo step positions.
 
-    print("Projected coordinates:")
-    print("Nx:", nx)
-    print("Ny:", ny)
+    Args:
+        angles (np.ndarray): Nx4 joint angles in radians
 
-    # Calculate theta3 using the law of cosines
-    cos_theta3 = (nx**2 + ny**2 - a2**2 - a3**2) / (2 * a2 * a3)
+    Returns:
+        np.ndarray: Nx4 int64 step positions, 0 where the shifted angle is not positive
+    """
+    shifted = np.asarray(angles) + np.pi
+    steps = np.floor(np.degrees(shifted) / 360 * STEPS_PER_REVOLUTION * GEAR_RATIOS)
+    return np.where(shifted > 0, steps, 0).astype(np.int64)
 
-    # Check if the value is within the valid range for arccos
-    if cos_theta3 < -1 or cos_theta3 > 1:
-        raise ValueError("Target is out of reach")
 
-    theta3 = np.arccos(cos_theta3)
-    print("theta3:", theta3)
+def inverse_kinematics_batch(targets, a2=152.794, a3=157.76, a4=90):
+    """
+    Solve inverse kinematics for many targets at once.
+
+    Unreachable targets still get angles, computed with the law of cosines clipped to
+    the arm's reach, so they point the arm towards the target; check `valid` before use.
+
+    Args:
+        targets (array-like): Nx3 (x, y, z) targets in mm, a single (x, y, z) is accepted too
+        a2 (float): Upper arm length
+        a3 (float): Forearm length
+        a4 (float): Wrist to end effector length
+
+    Returns:
+        tuple: (angles, steps, valid, status) - Nx4 joint angles in radians, Nx4 int64 step
+            positions, N bool validity mask and N int status bit flags (IK_* constants)
+    """
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+    x, y, z = targets[:, 0], targets[:, 1], targets[:, 2]
+
+    theta1 = np.arctan2(y, x)
+
+    # Project the target point into the plane of the second and third joints
+    nx = np.hypot(x, y)
+    ny = SHOULDER_HEIGHT - z
+
+    # Calculate theta3 using the law of cosines
+    cos_theta3 = (nx**2 + ny**2 - a2**2 - a3**2) / (2 * a2 * a3)
+    reachable = np.abs(cos_theta3) <= 1
+    theta3 = np.arccos(np.clip(cos_theta3, -1, 1))
 
     # Calculate theta2 using the geometric method
     k1 = a2 + a3 * np.cos(theta3)
     k2 = a3 * np.sin(theta3)
+    theta2 = np.arctan2(ny, nx) - np.arctan2(k2, k1)
+
+    # Keep the end effector pointing straight down
+    theta4 = -(theta2 + theta3 + np.pi / 2)
 
-    beta = np.arctan2(ny, nx)
-    alpha = np.arctan2(k2, k1)
-
-    theta2 = beta - alpha
-    # if(theta2 < 0):
-    #     raise ValueError("Target is out of reach")
-    print("theta2:", theta2)
-
-    theta4 = -(theta2 + theta3 + np.pi/2)
-
-    print("theta4:", theta4)
-    theta1_1 = theta1 + 3.141592653589793
-    theta2_1 = theta2 + 3.141592653589793
-    theta3_1 = theta3 + 3.141592653589793
-    theta4_1 = theta4 + 3.141592653589793
-
-
-    steps_per_revolution = 4096
-    if(theta1_1>0):
-        pos1 = int((math.degrees(theta1_1) / 360) * steps_per_revolution)
-    # elif(theta1 != 0):
-    #     pos1 = int(((math.degrees(theta1) / -360) * 2 * steps_per_revolution) + 2048)
-    else:
-        pos1 = 0
-    if(theta2_1>0):
-        pos2 = int((math.degrees(theta2_1) / 360) * steps_per_revolution * (54/28))
-    # elif(theta1 != 0):
-    #     pos1 = int(((math.degrees(theta1) / -360) * 2 * steps_per_revolution) + 2048)
-    else:
-        pos2 = 0
-    if(theta3_1>0):
-        pos3 = int((math.degrees(theta3_1) / 360) * steps_per_revolution)
-    # elif(theta1 != 0):
-    #     pos1 = int(((math.degrees(theta1) / -360) * 2 * steps_per_revolution) + 2048)
-    else:
-        pos3 = 0
-    if(theta4_1>0):
-        pos4 = int((math.degrees(theta4_1) / 360) * steps_per_revolution)
-    # elif(theta1 != 0):
-    #     pos1 = int(((math.degrees(theta1) / -360) * 2 * steps_per_revolution) + 2048)
-    else:
-        pos4 = 0
-    compute_end_pos(theta1, theta2, theta3, theta4)
-
-    if(pos3 < 150):
-        valid_position = 0
-    else:
-        valid_position = 1
-    if(pos4 < 1024):
-        valid_position = 0
-    else:
-        valid_position = 1
-
-    print("pos",pos1)
-    print(pos2)
-    print(pos3)
-    print(pos4)
-
-
-    return theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4, valid_position
+    angles = np.stack((theta1, theta2, theta3, theta4), axis=1)
+    steps = joint_steps(angles)
+
+    status = np.where(reachable, IK_OK, IK_OUT_OF_REACH)
+    end, points, above_ground = forward_kinematics_batch(angles, a2, a3, a4)
+    status |= np.where(above_ground, IK_OK, IK_BELOW_GROUND)
+    status |= np.where((steps[:, 2] < MIN_POS3) | (steps[:, 3] < MIN_POS4), IK_JOINT_LIMIT, IK_OK)
+    return angles, steps, status == IK_OK, status
+
+
+def inverse_kinematics(x, y, z, a2=152.794, a3=157.76, a4=90):
+    """
+    Solve inverse kinematics for a single target.
+
+    Returns:
+        tuple: (theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4, valid_position),
+            valid_position is 0 when joint 3 or 4 would go below its minimum step position
+
+    Raises:
+        ValueError: If the target is out of reach or the arm would touch the ground
+    """
+    angles, steps, valid, status = inverse_kinematics_batch((x, y, z), a2, a3, a4)
+    if status[0] & IK_OUT_OF_REACH:
+        raise ValueError("Target is out of reach")
+    if status[0] & IK_BELOW_GROUND:
+        raise ValueError("Jeden z punktów znajduje się poniżej lub na poziomie 0 w osi Z")
+    return (*angles[0].tolist(), *steps[0].tolist(), int(valid[0]))
+
+
+class IKCache:
+    def __init__(self, resolution=0.5, maxsize=1024):
+        """
+        Bounded LRU cache in front of inverse_kinematics.
+
+        Targets are quantised to a grid of `resolution` mm and solved at the grid point, so
+        all targets within the same cell share one solution, e.g. a tracked object that
+        jitters by a fraction of a millimetre. The solution reaches a point at most
+        `tolerance` (half the cell diagonal) from the requested target, and near the edge of
+        the workspace or a joint limit it can be valid for the grid point but not for the
+        target or the other way round. Failed solves are cached too. All entries are dropped
+        whenever the link lengths differ from the ones the cached solutions were made with.
+        Joint offsets are applied to the step positions when they are sent, so they don't
+        affect the cache.
+
+        Args:
+            resolution (float): Quantisation step in mm
+            maxsize (int): Maximum number of cached targets
+        """
+        self.resolution = resolution
+        self.tolerance = resolution * np.sqrt(3) / 2
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.configuration = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def invalidate(self):
+        """Drop all cached solutions"""
+        self.entries.clear()
+        self.invalidations += 1
+
+    def solve(self, x, y, z, a2=152.794, a3=157.76, a4=90):
+        """
+        Cached inverse_kinematics, solved at the grid point nearest to the target.
+
+        Args:
+            x, y, z (float): Target in mm
+            a2, a3, a4 (float): Link lengths, a change invalidates the cache
+
+        Returns:
+            tuple: See inverse_kinematics, for a point within `tolerance` of the target
+
+        Raises:
+            ValueError: See inverse_kinematics
+        """
+        configuration = (a2, a3, a4)
+        if configuration != self.configuration:
+            if self.configuration is not None:
+                self.invalidate()
+            self.configuration = configuration
+
+        key = tuple(int(round(float(value) / self.resolution)) for value in (x, y, z))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            try:
+                entry = (inverse_kinematics(*(k * self.resolution for k in key), a2, a3, a4), None)
+            except ValueError as e:
+                entry = (None, e)
+            self.entries[key] = entry
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        solution, error = entry
+        if error is not None:
+            raise ValueError(*error.args)
+        return solution
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Hits, misses, hit ratio, invalidations and current size
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'invalidations': self.invalidations,
+            'size': len(self.entries),
+        }
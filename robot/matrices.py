@@ -38,20 +38,85 @@ def T5(a5):
     ])
     
 
+def forward_kinematics_batch(angles, a3=152.794, a4=157.76, a5=90):
+    """
+    Closed-form forward kinematics for many joint configurations, equivalent to chaining
+    T1..T5 but without building any matrices.
+
+    Args:
+        angles (array-like): Nx4 (theta1, theta2, theta3, theta4) in radians, a single configuration is accepted too
+        a3 (float): Upper arm length
+        a4 (float): Forearm length
+        a5 (float): Wrist to end effector length
+
+    Returns:
+        tuple: (end, points, above_ground) - Nx3 end effector positions, Nx6x3 link points
+            (base, T1..T5 origins) and an N bool mask, False where the elbow, wrist or end
+            effector is at or below z = 0
+    """
+    angles = np.asarray(angles, dtype=np.float64).reshape(-1, 4)
+    theta1 = angles[:, 0]
+    theta2 = angles[:, 1]
+    theta23 = theta2 + angles[:, 2]
+    theta234 = theta23 + angles[:, 3]
+
+    # Every link moves in the vertical plane rotated by theta1: distance from the z axis and height
+    r = np.zeros((len(angles), 6))
+    z = np.zeros((len(angles), 6))
+    r[:, 3] = a3 * np.cos(theta2)
+    z[:, 3] = -a3 * np.sin(theta2)
+    r[:, 4] = r[:, 3] + a4 * np.cos(theta23)
+    z[:, 4] = z[:, 3] - a4 * np.sin(theta23)
+    r[:, 5] = r[:, 4] + a5 * np.cos(theta234)
+    z[:, 5] = z[:, 4] - a5 * np.sin(theta234)
+
+    points = np.empty((len(angles), 6, 3))
+    points[:, :, 0] = r * np.cos(theta1)[:, np.newaxis]
+    points[:, :, 1] = r * np.sin(theta1)[:, np.newaxis]
+    points[:, :, 2] = z
+    above_ground = (z[:, 3:] > 0).all(axis=1)
+    return points[:, 5], points, above_ground
+
+
 def compute_end_pos(theta1, theta2, theta3, theta4, a3=152.794, a4=157.76, a5=90):
-    T1_matrix = T1(theta1)
-    T2_matrix = np.dot(T1_matrix, T2(theta2))
-    T3_matrix = np.dot(T2_matrix, T3(theta3, a3))
-    T4_matrix = np.dot(T3_matrix, T4(theta4, a4))
-    T5_matrix = np.dot(T4_matrix, T5(a5))
-    
-    z1 = T1_matrix[2, 3]
-    z2 = T2_matrix[2, 3]
-    z3 = T3_matrix[2, 3]
-    z4 = T4_matrix[2, 3]
-    z5 = T5_matrix[2, 3]
-    
-    if  z3 <= 0 or z4 <= 0 or z5 <= 0:
+    end, points, above_ground = forward_kinematics_batch((theta1, theta2, theta3, theta4), a3, a4, a5)
+    if not above_ground[0]:
         raise ValueError("Jeden z punktów znajduje się poniżej lub na poziomie 0 w osi Z")
-    
-    return T5_matrix[0, 3], T5_matrix[1, 3], z5
+    return tuple(end[0].tolist())
+
+
+def jacobian_batch(angles, a3=152.794, a4=157.76, a5=90):
+    """
+    Analytic position Jacobian of the end effector, the derivative of
+    forward_kinematics_batch's end position with respect to the joint angles.
+
+    Args:
+        angles (array-like): Nx4 joint angles in radians, a single configuration is accepted too
+        a3 (float): Upper arm length
+        a4 (float): Forearm length
+        a5 (float): Wrist to end effector length
+
+    Returns:
+        np.ndarray: Nx3x4 Jacobians in mm per radian
+    """
+    angles = np.asarray(angles, dtype=np.float64).reshape(-1, 4)
+    theta1 = angles[:, 0]
+    theta2 = angles[:, 1]
+    theta23 = theta2 + angles[:, 2]
+    theta234 = theta23 + angles[:, 3]
+    c1, s1 = np.cos(theta1), np.sin(theta1)
+
+    # Distance from the z axis (r) and height (z) of each link's contribution
+    r4, z4 = a5 * np.cos(theta234), -a5 * np.sin(theta234)
+    r3, z3 = r4 + a4 * np.cos(theta23), z4 - a4 * np.sin(theta23)
+    r2, z2 = r3 + a3 * np.cos(theta2), z3 - a3 * np.sin(theta2)
+
+    # d(r)/d(theta_i) = z_i and d(z)/d(theta_i) = -r_i for the links from joint i outwards
+    J = np.zeros((len(angles), 3, 4))
+    J[:, 0, 0] = -r2 * s1
+    J[:, 1, 0] = r2 * c1
+    for joint, (r, z) in enumerate(((r2, z2), (r3, z3), (r4, z4)), start=1):
+        J[:, 0, joint] = z * c1
+        J[:, 1, joint] = z * s1
+        J[:, 2, joint] = -r
+    return J
@@ -1,42 +1,62 @@
-import numpy as np
-
-from robot.kinematics import inverse_kinematics
+from robot.kinematics import IKCache
 from robot.matrices import *
+from robot.workspace import VOXEL_BOUNDARY, VOXEL_INSIDE
 
 class Robot:
-    def __init__(self) -> None:
+    def __init__(self, workspace=None) -> None:
         self.rx = 0
         self.ry = 0
         self.rz = 0
-
-    def update_robot(self, x, y, z):
+        # Optional robot.workspace.Workspace used to reject targets before solving IK
+        self.workspace = workspace
+        # Link lengths used for IK, changing them invalidates the IK cache
+        self.a2 = 152.794
+        self.a3 = 157.76
+        self.a4 = 90
+        self.ik_cache = IKCache()
+
+    def is_reachable(self, x, y, z):
+        """
+        Check whether a target has a valid IK solution.
+
+        With a workspace grid, targets in inside voxels are accepted and targets in outside
+        voxels rejected without solving; only boundary voxels are confirmed with IK. Without
+        a grid every target is solved. Solves go through the IK cache, so the answer holds for
+        a point within ik_cache.tolerance of the target.
+        """
+        if self.workspace is not None:
+            state = self.workspace.classify((x, y, z))[0]
+            if state != VOXEL_BOUNDARY:
+                return state == VOXEL_INSIDE
+        # Solve through the cache, so the solve is reused by update_robot and repeated checks
         try:
-            theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4, valid_position = inverse_kinematics(x, y, z)
-
-            if theta1 is not None:
-                return theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4
+            return bool(self.ik_cache.solve(x, y, z, self.a2, self.a3, self.a4)[-1])
         except ValueError:
-            print("ValueError")
+            return False
 
-        return 0, 0, 0, 0, 0, 0, 0, 0,
+    def update_robot(self, x, y, z):
+        """
+        Solve the joint angles and step positions for a target.
+
+        Returns:
+            tuple: (theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4)
+
+        Raises:
+            ValueError: If the target is not a number, outside the workspace, out of reach,
+                would put the arm below the ground or a joint past its step limit
+        """
+        x, y, z = float(x), float(y), float(z)
+        if self.workspace is not None and self.workspace.classify((x, y, z))[0] == 0:
+            raise ValueError("Target outside the reachable workspace")
+        theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4, valid_position = self.ik_cache.solve(
+            x, y, z, self.a2, self.a3, self.a4)
+        if not valid_position:
+            raise ValueError("Joint 3 or 4 would go below its minimum step position")
+        return theta1, theta2, theta3, theta4, pos1, pos2, pos3, pos4
 
     def compute_end_pos(self, theta1, theta2, theta3, theta4, a3, a4, a5):
         self.rx, self.ry, self.rz = compute_end_pos(theta1, theta2, theta3, theta4, a3, a4, a5)
 
     def t_ends(self, theta1, theta2, theta3, theta4, a3, a4, a5):
-        T1_end = T1(theta1)
-        T2_end = np.dot(T1_end, T2(theta2))
-        T3_end = np.dot(T2_end, T3(theta3, a3))
-        T4_end = np.dot(T3_end, T4(theta4, a4))
-        T5_end = np.dot(T4_end, T5(a5))
-
-        points = np.array([
-            [0, 0, 0],
-            T1_end[:3, 3],
-            T2_end[:3, 3],
-            T3_end[:3, 3],
-            T4_end[:3, 3],
-            T5_end[:3, 3]
-        ])
-
-        return points
+        end, points, above_ground = forward_kinematics_batch((theta1, theta2, theta3, theta4), a3, a4, a5)
+        return points[0]
@@ -0,0 +1,198 @@
+import asyncio
+import numpy as np
+from robot.kinematics import GEAR_RATIOS, STEPS_PER_REVOLUTION, inverse_kinematics_batch
+
+# Per-joint limits in servo steps per second and per second squared
+MAX_JOINT_VELOCITY = np.array([1500.0, 1500.0, 1500.0, 2000.0])
+MAX_JOINT_ACCELERATION = np.array([3000.0, 3000.0, 3000.0, 4000.0])
+# Servo steps per radian of each joint
+STEPS_PER_RADIAN = STEPS_PER_REVOLUTION / (2 * np.pi) * GEAR_RATIOS
+
+
+class Trajectory:
+    def __init__(self, times, points, angles, steps):
+        """
+        Time-parameterised joint trajectory.
+
+        Args:
+            times (np.ndarray): N waypoint times in seconds from the start
+            points (np.ndarray): Nx3 Cartesian waypoints in mm
+            angles (np.ndarray): Nx4 joint angles in radians
+            steps (np.ndarray): Nx4 servo step positions
+        """
+        self.times = times
+        self.points = points
+        self.angles = angles
+        self.steps = steps
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+
+class CommandedPose:
+    def __init__(self):
+        """
+        Last pose sent to the arm, where the next planned move or tracking run starts.
+
+        Updated for every waypoint actually sent, so a move that was cancelled halfway
+        leaves the waypoint the arm was last told to go to, not the goal it never reached.
+        """
+        self.point = None
+        self.angles = None
+
+    def update(self, point, angles):
+        """
+        Args:
+            point (array-like): (x, y, z) in mm
+            angles (array-like): Joint angles in radians, (theta1..theta4)
+        """
+        self.point = tuple(float(value) for value in point)
+        self.angles = tuple(float(value) for value in angles)
+
+
+class TrajectoryPlanner:
+    def __init__(self, rate=50.0, max_speed=150.0, max_acceleration=300.0,
+                 max_joint_velocity=MAX_JOINT_VELOCITY, max_joint_acceleration=MAX_JOINT_ACCELERATION,
+                 max_duration=30.0, a2=152.794, a3=157.76, a4=90):
+        """
+        Plans straight-line Cartesian motion through a polyline of waypoints.
+
+        The path is followed with a trapezoidal speed profile and sampled at the control rate.
+        All samples are solved in one IK batch. If any joint would exceed its velocity or
+        acceleration limit, the whole profile is slowed down uniformly until none does, up
+        to max_duration.
+
+        Args:
+            rate (float): Control rate in waypoints per second
+            max_speed (float): Cartesian speed limit in mm/s
+            max_acceleration (float): Cartesian acceleration limit in mm/s^2
+            max_joint_velocity (array-like): Per-joint velocity limits in steps/s
+            max_joint_acceleration (array-like): Per-joint acceleration limits in steps/s^2
+            max_duration (float): Longest trajectory in seconds the retiming may produce
+            a2 (float): Upper arm length
+            a3 (float): Forearm length
+            a4 (float): Wrist to end effector length
+        """
+        self.rate = rate
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
+        self.max_joint_velocity = np.asarray(max_joint_velocity, dtype=np.float64)
+        self.max_joint_acceleration = np.asarray(max_joint_acceleration, dtype=np.float64)
+        self.max_duration = max_duration
+        self.a2 = a2
+        self.a3 = a3
+        self.a4 = a4
+
+    def _profile(self, length):
+        """Acceleration time, peak speed and duration of the fastest trapezoidal profile over length"""
+        t_acc = self.max_speed / self.max_acceleration
+        if length >= self.max_speed * t_acc:
+            return t_acc, self.max_speed, length / self.max_speed + t_acc
+        # Too short to reach full speed: triangular profile
+        t_acc = np.sqrt(length / self.max_acceleration)
+        return t_acc, self.max_acceleration * t_acc, 2 * t_acc
+
+    @staticmethod
+    def _arc_length(t, t_acc, v_peak, duration, length):
+        """Distance travelled at times t along a trapezoidal profile"""
+        accel = v_peak / t_acc
+        t_dec = duration - t_acc
+        s = np.where(t < t_acc, 0.5 * accel * t**2, v_peak * (t - 0.5 * t_acc))
+        s = np.where(t > t_dec, length - 0.5 * accel * (duration - t)**2, s)
+        return np.clip(s, 0, length)
+
+    def plan(self, path, max_iterations=8):
+        """
+        Plan a trajectory.
+
+        Args:
+            path (array-like): Kx3 waypoints in mm starting at the current position,
+                or a (start, goal) pair for a straight move
+            max_iterations (int): Retiming attempts before giving up on the joint limits
+
+        Returns:
+            Trajectory: Waypoints at the control rate, the first one is the start position
+
+        Raises:
+            ValueError: If a waypoint is not reachable, the move would turn joint 1 across the
+                negative x axis, or the joint limits can't be met within max_duration
+        """
+        path = np.asarray(path, dtype=np.float64).reshape(-1, 3)
+        cumulative = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(path, axis=0), axis=1))))
+        length = cumulative[-1]
+        if length == 0:
+            angles, steps, valid, status = inverse_kinematics_batch(path[-1:], self.a2, self.a3, self.a4)
+            if not valid[0]:
+                raise ValueError(f"Target {path[-1].tolist()} is not reachable (status {status[0]})")
+            return Trajectory(np.zeros(1), path[-1:], angles, steps)
+
+        t_acc, v_peak, duration = self._profile(length)
+        # Slowing the profile down by a factor k divides joint velocities by k and accelerations by k^2
+        scale = 1.0
+        for _ in range(max_iterations):
+            if duration * scale > self.max_duration:
+                raise ValueError(f"Meeting the joint limits would take {duration * scale:.1f} s, "
+                                 f"more than {self.max_duration:.1f} s")
+            count = int(np.ceil(duration * scale * self.rate)) + 1
+            times = np.linspace(0, duration * scale, count)
+            s = self._arc_length(times / scale, t_acc, v_peak, duration, length)
+            points = np.stack([np.interp(s, cumulative, path[:, axis]) for axis in range(3)], axis=1)
+
+            angles, steps, valid, status = inverse_kinematics_batch(points, self.a2, self.a3, self.a4)
+            if not valid.all():
+                i = int(np.argmin(valid))
+                raise ValueError(f"Waypoint {points[i].round(1).tolist()} is not reachable (status {status[i]})")
+            if count < 3:
+                return Trajectory(times, points, angles, steps)
+
+            # theta1 jumps by 2*pi where the path crosses the negative x axis. Unwrapped, that is
+            # a continuous turn past the end of joint 1's step range, which the servo can't make
+            unwrapped = np.unwrap(angles, axis=0)
+            if not np.allclose(unwrapped, angles):
+                raise ValueError("Move crosses the negative x axis, joint 1 can't turn across it")
+
+            # Use the continuous angles, integer steps would add quantisation noise to the acceleration
+            dt = times[1] - times[0]
+            joint_steps = unwrapped * STEPS_PER_RADIAN
+            velocity = np.abs(np.diff(joint_steps, axis=0)).max(axis=0) / dt
+            acceleration = np.abs(np.diff(joint_steps, n=2, axis=0)).max(axis=0) / dt**2
+            excess = max((velocity / self.max_joint_velocity).max(),
+                         np.sqrt((acceleration / self.max_joint_acceleration).max()))
+            if excess <= 1.0:
+                return Trajectory(times, points, angles, steps)
+            scale *= excess * 1.02
+        raise ValueError("Could not meet the joint velocity and acceleration limits")
+
+
+async def stream_trajectory(trajectory, send, commanded=None):
+    """
+    Send the step positions of a trajectory at its control rate.
+
+    Each waypoint is handed to send() at its time, and the loop yields to the event loop
+    in between so the GUI keeps running. If the loop falls behind, stale waypoints are
+    skipped in favour of the one due now. The first waypoint is not sent, the trajectory
+    must be planned from the last commanded pose.
+
+    Args:
+        trajectory (Trajectory): Planned trajectory, the first waypoint is the current position
+        send (callable): Called with the 4 step positions of a waypoint
+        commanded (CommandedPose): Updated with every waypoint sent, also when the stream is cancelled
+    """
+    loop = asyncio.get_running_loop()
+    t_start = loop.time()
+    i = 1
+    while i < len(trajectory):
+        delay = t_start + trajectory.times[i] - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Jump to the latest waypoint that is due
+        elapsed = loop.time() - t_start
+        i = max(i, int(np.searchsorted(trajectory.times, elapsed, side="right")) - 1)
+        send(trajectory.steps[i].tolist())
+        if commanded is not None:
+            commanded.update(trajectory.points[i], trajectory.angles[i])
+        i += 1
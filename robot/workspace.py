@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import numpy as np
+from robot.kinematics import (IK_BELOW_GROUND, IK_JOINT_LIMIT, IK_OUT_OF_REACH, MIN_POS3, MIN_POS4,
+                              SHOULDER_HEIGHT, inverse_kinematics_batch)
+
+# Per-voxel flags
+VOXEL_REACHABLE = 1   # IK has a solution above the ground somewhere in the voxel
+VOXEL_IN_LIMITS = 2   # ...that also respects the joint 3 and 4 limits
+VOXEL_MARGIN = 4      # Everywhere sampled in the voxel has at least `margin` steps to spare on both
+VOXEL_INSIDE = 8      # Everywhere sampled in the voxel is valid: accept without IK
+VOXEL_BOUNDARY = 16   # Not inside, but a valid point was sampled in the voxel or a neighbour: confirm with IK
+VOXEL_VALID = VOXEL_REACHABLE | VOXEL_IN_LIMITS
+# A voxel with neither VOXEL_INSIDE nor VOXEL_BOUNDARY is outside: reject without IK
+
+# Bumped whenever the meaning of the flags changes, older grids have to be rebuilt
+WORKSPACE_FORMAT = 2
+
+DEFAULT_WORKSPACE_DIR = "workspace"
+DEFAULT_BOUNDS = ((-400.0, 400.0), (-400.0, 400.0), (0.0, 500.0))
+
+
+def _grid_centers(origin, resolution, shape, k):
+    """Voxel centers of z layer k as an (nx*ny)x3 array"""
+    i, j = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), indexing="ij")
+    centers = np.empty((i.size, 3))
+    centers[:, 0] = origin[0] + (i.ravel() + 0.5) * resolution
+    centers[:, 1] = origin[1] + (j.ravel() + 0.5) * resolution
+    centers[:, 2] = origin[2] + (k + 0.5) * resolution
+    return centers
+
+
+def _classify(points, margin, a2, a3, a4):
+    """Per-point (reachable, in_limits, margin) masks and joint angles of the IK solutions"""
+    angles, steps, valid, status = inverse_kinematics_batch(points, a2, a3, a4)
+    reachable = (status & (IK_OUT_OF_REACH | IK_BELOW_GROUND)) == 0
+    in_limits = (status & IK_JOINT_LIMIT) == 0
+    spare = np.minimum(steps[:, 2] - MIN_POS3, steps[:, 3] - MIN_POS4)
+    return reachable, in_limits, spare >= margin, angles
+
+
+def _corner_plane(origin, resolution, shape, k, margin, a2, a3, a4):
+    """
+    Classify the voxel corners in plane z = origin + k * resolution and combine the four
+    corners of every voxel face: (any reachable, any valid, all with margin, all valid),
+    each nx x ny.
+    """
+    i, j = np.meshgrid(np.arange(shape[0] + 1), np.arange(shape[1] + 1), indexing="ij")
+    corners = np.empty((i.size, 3))
+    corners[:, 0] = origin[0] + i.ravel() * resolution
+    corners[:, 1] = origin[1] + j.ravel() * resolution
+    corners[:, 2] = origin[2] + k * resolution
+    reachable, in_limits, spare, angles = _classify(corners, margin, a2, a3, a4)
+
+    combined = []
+    valid = reachable & in_limits
+    for mask, combine in ((reachable, np.logical_or), (valid, np.logical_or),
+                          (valid & spare, np.logical_and), (valid, np.logical_and)):
+        mask = mask.reshape(shape[0] + 1, shape[1] + 1)
+        combined.append(combine.reduce((mask[:-1, :-1], mask[1:, :-1], mask[:-1, 1:], mask[1:, 1:])))
+    return combined
+
+
+def _thin_regions(origin, resolution, shape, k, a2, a3):
+    """
+    Voxels of z layer k that may hold valid regions too thin for the samples to find: those
+    crossing the shortest or longest reach around the shoulder, where the arm is folded or
+    stretched, and those next to the base axis, where theta1 turns quickly. Found exactly from
+    each voxel's nearest and farthest distance to the shoulder and the axis.
+    """
+    low = [origin[axis] + np.arange(shape[axis]) * resolution for axis in range(2)]
+    low.append(np.array([origin[2] + k * resolution - SHOULDER_HEIGHT]))
+    nearest = [np.where(l > 0, l, np.where(l + resolution < 0, -(l + resolution), 0)) for l in low]
+    farthest = [np.maximum(np.abs(l), np.abs(l + resolution)) for l in low]
+
+    axis_distance = np.hypot(nearest[0][:, None], nearest[1][None, :])
+    nearest = np.sqrt(axis_distance**2 + nearest[2]**2)
+    farthest = np.sqrt(farthest[0][:, None]**2 + farthest[1][None, :]**2 + farthest[2]**2)
+
+    crosses = np.zeros(shape[:2], dtype=bool)
+    for reach in (a2 + a3, abs(a2 - a3)):
+        crosses |= (nearest <= reach) & (farthest >= reach)
+    return crosses | (axis_distance <= resolution)
+
+
+def _dilate(mask):
+    """Grow a 3D mask by one voxel in every direction, diagonals included"""
+    for axis in range(mask.ndim):
+        grown = mask.copy()
+        lower = [slice(None)] * mask.ndim
+        upper = [slice(None)] * mask.ndim
+        lower[axis] = slice(None, -1)
+        upper[axis] = slice(1, None)
+        grown[tuple(upper)] |= mask[tuple(lower)]
+        grown[tuple(lower)] |= mask[tuple(upper)]
+        mask = grown
+    return mask
+
+
+def build_workspace(path=DEFAULT_WORKSPACE_DIR, bounds=DEFAULT_BOUNDS, resolution=5.0, margin=64,
+                    a2=152.794, a3=157.76, a4=90):
+    """
+    Sample the arm's workspace on a voxel grid and save it for memory-mapped lookups.
+
+    Each voxel is classified by solving IK for its center and its eight corners, one z
+    layer per batch. A voxel is reachable or in limits if any of those points is, and
+    gets the margin only if all of them have it. It is inside if all of them are valid.
+    Every other voxel near a sampled valid point (in it or one of its 26 neighbours), or
+    where the valid region can be too thin to sample (see _thin_regions), is boundary,
+    and the rest is outside. The directory gets meta.json (grid and arm parameters),
+    flags.npy (uint8 VOXEL_* flags) and seeds.npy (float32 joint angles of the center's
+    solution, usable as IK seeds).
+
+    Args:
+        path (str): Output directory
+        bounds (tuple): ((xmin, xmax), (ymin, ymax), (zmin, zmax)) in mm
+        resolution (float): Voxel edge length in mm
+        margin (int): Joint-limit margin in steps for VOXEL_MARGIN
+        a2 (float): Upper arm length
+        a3 (float): Forearm length
+        a4 (float): Wrist to end effector length
+
+    Returns:
+        Workspace: The saved workspace, loaded back memory-mapped
+    """
+    origin = np.array([low for low, high in bounds], dtype=np.float64)
+    shape = tuple(int(np.ceil((high - low) / resolution)) for low, high in bounds)
+    os.makedirs(path, exist_ok=True)
+
+    flags = np.lib.format.open_memmap(os.path.join(path, "flags.npy"), mode="w+", dtype=np.uint8, shape=shape)
+    seeds = np.lib.format.open_memmap(os.path.join(path, "seeds.npy"), mode="w+", dtype=np.float32,
+                                      shape=(*shape, 4))
+    below = _corner_plane(origin, resolution, shape, 0, margin, a2, a3, a4)
+    for k in range(shape[2]):
+        above = _corner_plane(origin, resolution, shape, k + 1, margin, a2, a3, a4)
+        reachable, in_limits, spare, angles = _classify(_grid_centers(origin, resolution, shape, k),
+                                                        margin, a2, a3, a4)
+        center_valid = reachable & in_limits
+        reachable = reachable.reshape(shape[:2]) | below[0] | above[0]
+        in_limits = center_valid.reshape(shape[:2]) | below[1] | above[1]
+        spare = (center_valid & spare).reshape(shape[:2]) & below[2] & above[2]
+        inside = center_valid.reshape(shape[:2]) & below[3] & above[3]
+
+        layer = np.where(reachable, VOXEL_REACHABLE, 0)
+        layer |= np.where(in_limits, VOXEL_IN_LIMITS, 0)
+        layer |= np.where(spare, VOXEL_MARGIN, 0)
+        layer |= np.where(inside, VOXEL_INSIDE, 0)
+        layer |= np.where(_thin_regions(origin, resolution, shape, k, a2, a3) & ~inside, VOXEL_BOUNDARY, 0)
+        flags[:, :, k] = layer
+        seeds[:, :, k] = angles.reshape(*shape[:2], 4)
+        below = above
+
+    # Everything else near a sampled valid point that isn't inside is boundary too
+    inside = (flags & VOXEL_INSIDE) != 0
+    near_valid = _dilate((flags & VOXEL_IN_LIMITS) != 0)
+    flags |= np.where(near_valid & ~inside, VOXEL_BOUNDARY, 0).astype(np.uint8)
+    flags.flush()
+    seeds.flush()
+    del flags, seeds
+
+    meta = {
+        "format": WORKSPACE_FORMAT,
+        "origin": origin.tolist(),
+        "resolution": resolution,
+        "shape": list(shape),
+        "margin": margin,
+        "arm": {"a2": a2, "a3": a3, "a4": a4, "min_pos3": MIN_POS3, "min_pos4": MIN_POS4},
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return Workspace(path)
+
+
+class Workspace:
+    def __init__(self, path=DEFAULT_WORKSPACE_DIR):
+        """
+        Memory-mapped voxel grid written by build_workspace. Lookups are O(1) per point
+        and only touch the pages they need.
+
+        Args:
+            path (str): Workspace directory
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.origin = np.array(self.meta["origin"])
+        self.resolution = self.meta["resolution"]
+        self.shape = np.array(self.meta["shape"])
+        self.flags = np.load(os.path.join(path, "flags.npy"), mmap_mode="r")
+        self.seeds = np.load(os.path.join(path, "seeds.npy"), mmap_mode="r")
+
+    def matches(self, a2=152.794, a3=157.76, a4=90):
+        """Check whether the grid was built for these link lengths, the current joint limits and flags"""
+        return (self.meta.get("format") == WORKSPACE_FORMAT and
+                self.meta["arm"] == {"a2": a2, "a3": a3, "a4": a4, "min_pos3": MIN_POS3, "min_pos4": MIN_POS4})
+
+    def voxel_index(self, points):
+        """
+        Voxel indices of points.
+
+        Args:
+            points (array-like): Nx3 points in mm, a single (x, y, z) is accepted too
+
+        Returns:
+            tuple: (index, inside) - Nx3 int voxel indices (clipped to the grid) and an N bool mask
+                of points inside the grid
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        index = np.floor((points - self.origin) / self.resolution).astype(np.int64)
+        inside = ((index >= 0) & (index < self.shape)).all(axis=1)
+        return np.clip(index, 0, self.shape - 1), inside
+
+    def query(self, points):
+        """
+        Look up the flags of points.
+
+        Returns:
+            np.ndarray: N uint8 VOXEL_* flags, 0 for points outside the grid
+        """
+        index, inside = self.voxel_index(points)
+        flags = self.flags[index[:, 0], index[:, 1], index[:, 2]]
+        return np.where(inside, flags, 0).astype(np.uint8)
+
+    def valid(self, points, require_margin=False):
+        """
+        Screen points before running IK.
+
+        Args:
+            points (array-like): Nx3 points in mm
+            require_margin (bool): Also require the joint-limit margin
+
+        Returns:
+            np.ndarray: N bool mask of points whose voxel is reachable within the joint limits.
+                The grid is sampled, so a solvable point right at the boundary can still be
+                missed; confirm misses with IK where that matters (see Robot.is_reachable)
+        """
+        required = VOXEL_VALID | VOXEL_MARGIN if require_margin else VOXEL_VALID
+        return (self.query(points) & required) == required
+
+    def classify(self, points):
+        """
+        Sort points into the three workspace states.
+
+        Returns:
+            np.ndarray: N uint8 with VOXEL_INSIDE, VOXEL_BOUNDARY or 0 for outside
+                (including points outside the grid)
+        """
+        return self.query(points) & (VOXEL_INSIDE | VOXEL_BOUNDARY)
+
+    def contains(self, x, y, z):
+        """Check a single point, see valid()"""
+        return bool(self.valid((x, y, z))[0])
+
+    def seed(self, points):
+        """
+        Joint angles solved for the voxel centers of points, a starting guess for iterative IK.
+
+        Returns:
+            np.ndarray: Nx4 float32 angles, NaN for points outside the grid
+        """
+        index, inside = self.voxel_index(points)
+        seeds = np.array(self.seeds[index[:, 0], index[:, 1], index[:, 2]])
+        seeds[~inside] = np.nan
+        return seeds
+
+
+def load_workspace(path=DEFAULT_WORKSPACE_DIR, a2=152.794, a3=157.76, a4=90):
+    """
+    Load a workspace grid if one was built for the current arm.
+
+    Returns:
+        Workspace: The grid, or None if it is missing or stale
+    """
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        print(f"[i] No workspace grid in {path}, build one with: python -m robot.workspace --out {path}")
+        return None
+    workspace = Workspace(path)
+    if not workspace.matches(a2, a3, a4):
+        print(f"[-] Workspace grid in {path} was built for another arm or an older format, rebuild it with: python -m robot.workspace --out {path}")
+        return None
+    return workspace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the reachable-workspace voxel grid")
+    parser.add_argument("--out", default=DEFAULT_WORKSPACE_DIR)
+    parser.add_argument("--resolution", type=float, default=5.0, help="Voxel edge length in mm")
+    parser.add_argument("--margin", type=int, default=64, help="Joint-limit margin in steps")
+    args = parser.parse_args()
+
+    workspace = build_workspace(args.out, resolution=args.resolution, margin=args.margin)
+    flags = np.asarray(workspace.flags)
+    print(f"[+] Built {'x'.join(str(n) for n in workspace.shape)} grid in {args.out}: "
+          f"{np.count_nonzero((flags & VOXEL_VALID) == VOXEL_VALID)} valid voxels, "
+          f"{np.count_nonzero(flags & VOXEL_INSIDE)} inside, {np.count_nonzero(flags & VOXEL_BOUNDARY)} boundary")
+
+
+if __name__ == "__main__":
+    main()
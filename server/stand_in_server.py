@@ -0,0 +1,446 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import cv2
+import numpy as np
+import websockets
+from camera.distortion import display_w, display_h
+from ws.frame_processor import pack_frame_data, parse_frame_data
+from ws.protocol import (MSG_ACK, MSG_SERVO_9G, MSG_SERVO_ST, MSG_TELEMETRY, TEXT_ACK, ProtocolError,
+                         decode_message, encode_message, is_protocol_message)
+from ws.recording import FrameRecording
+from ws.stream_control import parse_stream_control
+
+# Text servo commands, e.g. "msg-servo-st.*1,2048*" or "msg-servo-9g.*2,90,0.01,1*#17" with a message id to acknowledge
+TEXT_COMMAND = re.compile(r"^(msg-servo-st|msg-servo-9g)\.\*([^*]*)\*(?:#(\d+))?$")
+
+# JPEG comment segment marker, used to pad frames to a requested payload size
+JPEG_COM = b"\xff\xfe"
+MAX_SEGMENT = 0xFFFF - 2
+
+
+def pad_jpeg(jpeg, size):
+    """
+    Pad a JPEG to at least size bytes with comment segments after the SOI marker.
+    Decoders skip comment segments, so the image is unchanged.
+
+    Args:
+        jpeg (bytes): Encoded image
+        size (int): Minimum payload size in bytes
+
+    Returns:
+        bytes: Padded image
+    """
+    missing = size - len(jpeg)
+    if missing <= 0:
+        return jpeg
+    segments = []
+    while missing > 0:
+        # Each segment costs 4 bytes of marker and length on top of its body
+        body = max(0, min(MAX_SEGMENT, missing - 4))
+        segments.append(JPEG_COM + (body + 2).to_bytes(2, "big") + bytes(body))
+        missing -= body + 4
+    return jpeg[:2] + b"".join(segments) + jpeg[2:]
+
+
+class SyntheticCamera:
+    def __init__(self, width=display_w, height=display_h, seed=0):
+        """
+        Generates stereo test frames: a gradient background with a moving marker,
+        shifted between the two cameras so the pair looks like a stereo view.
+        Frames only depend on the frame index and seed, so runs are reproducible.
+
+        Args:
+            width (int): Full-resolution frame width
+            height (int): Full-resolution frame height
+            seed (int): Seed for the sensor noise pattern
+        """
+        self.width = width
+        self.height = height
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)
+        background = np.dstack([
+            np.tile(x, (height, 1)),
+            np.tile(y[:, np.newaxis], (1, width)),
+            np.full((height, width), 96, dtype=np.float32),
+        ])
+        # Fixed noise keeps JPEG sizes close to real camera frames
+        noise = np.random.default_rng(seed).normal(0, 8, background.shape)
+        self.background = np.clip(background + noise, 0, 255).astype(np.uint8)
+
+    def frame(self, index, camera_index, scale=1.0):
+        """Render one frame for a camera at the given resolution scale"""
+        frame = self.background.copy()
+        t = index / 30.0
+        cx = int(self.width * (0.5 + 0.3 * np.sin(t)) + (40 if camera_index else 0))
+        cy = int(self.height * (0.5 + 0.3 * np.cos(t * 0.7)))
+        cv2.circle(frame, (cx, cy), self.width // 12, (0, 0, 255), -1)
+        cv2.putText(frame, f"cam {camera_index} #{index}", (40, 120), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 6)
+        if scale != 1.0:
+            frame = cv2.resize(frame, (int(self.width * scale), int(self.height * scale)))
+        return frame
+
+    def pair(self, index, quality, scale):
+        """
+        Encode one stereo pair.
+
+        Returns:
+            tuple: (jpeg0, jpeg1) as bytes
+        """
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        return tuple(cv2.imencode(".jpg", self.frame(index, camera_index, scale), params)[1].tobytes()
+                     for camera_index in range(2))
+
+
+class RecordedCamera:
+    def __init__(self, path):
+        """
+        Plays back stereo pairs from a SAVE_FRAMES recording, looping at the end.
+
+        Args:
+            path (str): Recording written by ws.recording.FrameRecorder
+        """
+        self.recording = FrameRecording(path)
+        if len(self.recording) == 0:
+            raise ValueError(f"Recording has no frames: {path}")
+
+    @property
+    def fps(self):
+        """Average frame rate of the recording"""
+        duration = self.recording.duration
+        return (len(self.recording) - 1) / duration if duration > 0 else 30
+
+    def pair(self, index, quality, scale):
+        """
+        Get one stereo pair. Recorded JPEGs are sent as they are unless a stream
+        control request asked for another quality or scale.
+
+        Returns:
+            tuple: (jpeg0, jpeg1) as bytes
+        """
+        payloads = parse_frame_data(self.recording[index % len(self.recording)][1])
+        if payloads is None:
+            raise ValueError(f"Malformed pair {index} in recording")
+        if quality is None and scale == 1.0:
+            return tuple(bytes(img) for img in payloads)
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality or 90]
+        jpegs = []
+        for img in payloads:
+            frame = cv2.imdecode(np.frombuffer(img, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if scale != 1.0:
+                frame = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)))
+            jpegs.append(cv2.imencode(".jpg", frame, params)[1].tobytes())
+        return tuple(jpegs)
+
+
+class SimulatedServos:
+    def __init__(self, servo_ids=(1, 2, 3, 4), speed=2000.0, seed=0):
+        """
+        Rough model of the robot's bus servos, used to produce telemetry. Positions move
+        towards the last commanded target at a fixed speed, current and load rise while
+        moving and temperature follows the load slowly.
+
+        Args:
+            servo_ids (tuple): Ids of the simulated servos
+            speed (float): Movement speed in steps per second
+            seed (int): Seed for the measurement noise
+        """
+        self.speed = speed
+        self.rng = np.random.default_rng(seed)
+        self.position = {servo_id: 2048.0 for servo_id in servo_ids}
+        self.target = dict(self.position)
+        self.temperature = {servo_id: 30.0 for servo_id in servo_ids}
+
+    def command(self, servo_id, position):
+        """Set the target position of a servo, unknown ids are added"""
+        self.target[servo_id] = float(position)
+        self.position.setdefault(servo_id, float(position))
+        self.temperature.setdefault(servo_id, 30.0)
+
+    def step(self, dt):
+        """
+        Advance the simulation.
+
+        Args:
+            dt (float): Elapsed time in seconds
+
+        Returns:
+            list: One telemetry record tuple per servo, in TELEMETRY_DTYPE field order
+        """
+        records = []
+        for servo_id, position in self.position.items():
+            error = self.target[servo_id] - position
+            move = float(np.clip(error, -self.speed * dt, self.speed * dt))
+            self.position[servo_id] = position + move
+            moving = abs(move) / max(self.speed * dt, 1e-9)
+
+            load = 0.1 + 0.6 * moving + self.rng.normal(0, 0.02)
+            current = 0.05 + 0.9 * moving + self.rng.normal(0, 0.01)
+            voltage = 7.4 - 0.3 * current + self.rng.normal(0, 0.02)
+            self.temperature[servo_id] += (30.0 + 25.0 * load - self.temperature[servo_id]) * min(1.0, dt / 60.0)
+            records.append((servo_id, voltage, current, self.temperature[servo_id],
+                            int(round(self.position[servo_id])), load))
+        return records
+
+
+class StandInServer:
+    def __init__(self, host="localhost", port=8765, recording=None, quality=None, scale=1.0, fps=None,
+                 payload_size=0, telemetry_rate=10.0, disconnect_after=None, disconnect_mode="close",
+                 command_log=None, stats_interval=5.0, ack_delay=0.0, ack_loss=0.0, seed=0):
+        """
+        Local stand-in for the robot and its camera server. Streams stereo JPEG pairs in the
+        length-prefixed format the client expects, logs servo commands, emits binary telemetry
+        and honours stream-control requests. Servo commands are acknowledged after a simulated
+        actuation delay. Disconnects and lost acknowledgements can be injected to exercise
+        reconnection and command retries.
+
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on
+            recording (str): SAVE_FRAMES recording to stream, synthetic frames if None
+            quality (int): JPEG quality, None keeps recorded JPEGs as they are (90 for synthetic frames)
+            scale (float): Resolution scale
+            fps (float): Frame rate, None uses the recording's rate (30 for synthetic frames)
+            payload_size (int): Minimum size of each JPEG in bytes, smaller ones are padded
+            telemetry_rate (float): Telemetry messages per second, 0 disables telemetry
+            disconnect_after (float): Mean time in seconds between injected disconnects, None disables them
+            disconnect_mode (str): "close" for a clean close handshake, "abort" to drop the TCP connection
+            command_log (str): File to append received servo commands to as JSON lines
+            stats_interval (float): Time in seconds between throughput reports
+            ack_delay (float): Time in seconds between receiving a servo command and acknowledging it
+            ack_loss (float): Probability of not acknowledging a command
+            seed (int): Seed for synthetic frames, telemetry noise, disconnect timing and lost acknowledgements
+        """
+        if disconnect_mode not in ("close", "abort"):
+            raise ValueError(f"Unknown disconnect mode: {disconnect_mode}")
+        self.host = host
+        self.port = port
+        if recording:
+            self.camera = RecordedCamera(recording)
+            self.quality = quality
+            self.fps = fps or self.camera.fps
+        else:
+            self.camera = SyntheticCamera(seed=seed)
+            self.quality = quality or 90
+            self.fps = fps or 30
+        self.scale = scale
+        self.payload_size = payload_size
+        self.telemetry_rate = telemetry_rate
+        self.disconnect_after = disconnect_after
+        self.disconnect_mode = disconnect_mode
+        self.stats_interval = stats_interval
+        self.ack_delay = ack_delay
+        self.ack_loss = ack_loss
+        self.ack_tasks = set()
+        self.rng = random.Random(seed)
+        self.servos = SimulatedServos(seed=seed)
+        self.command_log = open(command_log, "a") if command_log else None
+
+        self.frame_index = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.commands_received = 0
+        self.acks_sent = 0
+        self.disconnects_injected = 0
+
+    def apply_stream_control(self, settings):
+        """Apply the settings of a stream-control request, ignoring unknown or invalid fields"""
+        try:
+            if 'quality' in settings:
+                self.quality = int(min(100, max(1, settings['quality'])))
+            if 'scale' in settings:
+                self.scale = float(min(1.0, max(0.1, settings['scale'])))
+            if 'fps' in settings:
+                self.fps = float(min(120, max(1, settings['fps'])))
+        except (TypeError, ValueError):
+            print(f"[-] Invalid stream control request: {settings}")
+            return
+        print(f"[i] Stream set to quality {self.quality}, scale {self.scale}, {self.fps} fps")
+
+    def encode_pair(self, index):
+        """Get one stereo pair at the current settings, packed as a frame message"""
+        jpeg0, jpeg1 = self.camera.pair(index, self.quality, self.scale)
+        if self.payload_size:
+            jpeg0, jpeg1 = pad_jpeg(jpeg0, self.payload_size), pad_jpeg(jpeg1, self.payload_size)
+        return pack_frame_data(jpeg0, jpeg1)
+
+    def log_command(self, message_type, servo_id, values):
+        """Apply a servo command to the simulation and log it"""
+        self.commands_received += 1
+        if message_type == 'msg-servo-st' and values:
+            self.servos.command(servo_id, values[0])
+        print(f"[i] {message_type} servo {servo_id}: {', '.join(str(value) for value in values)}")
+        if self.command_log:
+            entry = {'time': time.time(), 'type': message_type, 'id': servo_id, 'values': list(values)}
+            self.command_log.write(json.dumps(entry) + "\n")
+            self.command_log.flush()
+
+    def acknowledge(self, websocket, message_id, binary):
+        """Acknowledge a command after the simulated actuation delay, unless the acknowledgement is lost"""
+        if self.rng.random() < self.ack_loss:
+            return
+
+        async def send_ack():
+            await asyncio.sleep(self.ack_delay)
+            if binary:
+                await websocket.send(encode_message(MSG_ACK, [(message_id,)]))
+            else:
+                await websocket.send(f"{TEXT_ACK}.{message_id}")
+            self.acks_sent += 1
+
+        task = asyncio.create_task(send_ack())
+        self.ack_tasks.add(task)
+        task.add_done_callback(self.ack_tasks.discard)
+
+    def handle_text(self, message, websocket):
+        settings = parse_stream_control(message)
+        if settings is not None:
+            self.apply_stream_control(settings)
+            return
+        match = TEXT_COMMAND.match(message)
+        if match is None:
+            print(f"[i] Received: {message}")
+            return
+        fields = match.group(2).split(",")
+        try:
+            servo_id = int(fields[0])
+            values = [float(value) if "." in value else int(value) for value in fields[1:]]
+        except ValueError:
+            print(f"[-] Malformed servo command: {message}")
+            return
+        self.log_command(match.group(1), servo_id, values)
+        if match.group(3) is not None:
+            self.acknowledge(websocket, int(match.group(3)), binary=False)
+
+    def handle_binary(self, data, websocket):
+        if not is_protocol_message(data):
+            print(f"[i] Received {len(data)} bytes")
+            return
+        try:
+            message_id, sequence, records = decode_message(data)
+        except ProtocolError as e:
+            print(f"[-] Bad protocol message: {e}")
+            return
+        if message_id not in (MSG_SERVO_ST, MSG_SERVO_9G):
+            print(f"[i] Ignoring protocol message {message_id}")
+            return
+        message_type = 'msg-servo-st' if message_id == MSG_SERVO_ST else 'msg-servo-9g'
+        for record in records.tolist():
+            self.log_command(message_type, record[0], list(record[1:]))
+        self.acknowledge(websocket, sequence, binary=True)
+
+    async def stream(self, websocket):
+        """Send stereo pairs at the current frame rate, the frame index carries over reconnects"""
+        next_time = time.monotonic()
+        while True:
+            data = self.encode_pair(self.frame_index)
+            await websocket.send(data)
+            self.frame_index += 1
+            self.frames_sent += 1
+            self.bytes_sent += len(data)
+            next_time = max(next_time + 1.0 / self.fps, time.monotonic() - 1.0)
+            await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+
+    async def telemetry(self, websocket):
+        """Send simulated servo telemetry"""
+        sequence = 0
+        last_time = time.monotonic()
+        while True:
+            await asyncio.sleep(1.0 / self.telemetry_rate)
+            now = time.monotonic()
+            records = self.servos.step(now - last_time)
+            last_time = now
+            sequence += 1
+            await websocket.send(encode_message(MSG_TELEMETRY, records, sequence))
+
+    async def receive(self, websocket):
+        """Handle messages from the client"""
+        async for message in websocket:
+            if isinstance(message, str):
+                self.handle_text(message, websocket)
+            else:
+                self.handle_binary(message, websocket)
+
+    async def inject_disconnect(self, websocket):
+        """Drop the connection after a random, exponentially distributed time"""
+        await asyncio.sleep(self.rng.expovariate(1.0 / self.disconnect_after))
+        self.disconnects_injected += 1
+        print(f"[!] Injecting disconnect ({self.disconnect_mode})")
+        if self.disconnect_mode == "abort":
+            websocket.transport.abort()
+        else:
+            await websocket.close(code=1011, reason="Injected disconnect")
+
+    async def report(self):
+        """Print throughput statistics"""
+        last_frames, last_bytes, last_time = self.frames_sent, self.bytes_sent, time.monotonic()
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            now = time.monotonic()
+            elapsed = now - last_time
+            print(f"[i] {(self.frames_sent - last_frames) / elapsed:.1f} pairs/s, "
+                  f"{(self.bytes_sent - last_bytes) / elapsed / 1e6:.2f} MB/s, "
+                  f"{self.commands_received} commands, {self.acks_sent} acks, {self.disconnects_injected} disconnects injected")
+            last_frames, last_bytes, last_time = self.frames_sent, self.bytes_sent, now
+
+    async def handler(self, websocket, path=None):
+        print("[+] Client connected")
+        tasks = [asyncio.create_task(self.stream(websocket)), asyncio.create_task(self.receive(websocket))]
+        if self.telemetry_rate:
+            tasks.append(asyncio.create_task(self.telemetry(websocket)))
+        if self.disconnect_after:
+            tasks.append(asyncio.create_task(self.inject_disconnect(websocket)))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print("[-] Client disconnected")
+
+    async def run(self):
+        async with websockets.serve(self.handler, self.host, self.port, max_size=None):
+            print(f"[+] Stand-in server listening on ws://{self.host}:{self.port}")
+            await self.report()
+
+    def close(self):
+        if self.command_log:
+            self.command_log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the robot and its camera server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recording", help="SAVE_FRAMES recording to stream instead of synthetic frames")
+    parser.add_argument("--quality", type=int, help="JPEG quality (default: as recorded, 90 for synthetic)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Resolution scale")
+    parser.add_argument("--fps", type=float, help="Frame rate (default: as recorded, 30 for synthetic)")
+    parser.add_argument("--payload-size", type=int, default=0, help="Pad each JPEG to at least this many bytes")
+    parser.add_argument("--telemetry-rate", type=float, default=10.0, help="Telemetry messages per second, 0 disables")
+    parser.add_argument("--disconnect-after", type=float, help="Mean seconds between injected disconnects")
+    parser.add_argument("--disconnect-mode", choices=("close", "abort"), default="close")
+    parser.add_argument("--command-log", help="Append received servo commands to this file as JSON lines")
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    parser.add_argument("--ack-delay", type=float, default=0.0, help="Simulated actuation delay before acknowledging")
+    parser.add_argument("--ack-loss", type=float, default=0.0, help="Probability of not acknowledging a command")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInServer(args.host, args.port, args.recording, args.quality, args.scale, args.fps,
+                           args.payload_size, args.telemetry_rate, args.disconnect_after, args.disconnect_mode,
+                           args.command_log, args.stats_interval, args.ack_delay, args.ack_loss, args.seed)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print("\n[+] Shutting down...")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from robot.kinematics import IKCache, inverse_kinematics, inverse_kinematics_batch
+from robot.matrices import forward_kinematics_batch
+
+
+def test_cache_hits_jittering_target():
+    # A tracked object seen at slightly different positions every frame
+    cache = IKCache(resolution=0.5)
+    jitter = np.random.default_rng(0).uniform(-0.2, 0.2, (1000, 3))
+    for target in np.array([150.0, 150.0, 258.0]) + jitter:
+        cache.solve(*target)
+    assert cache.stats()['hit_ratio'] > 0.99
+    assert cache.stats()['size'] == 1
+
+
+def test_cached_solution_is_within_tolerance():
+    cache = IKCache(resolution=0.5)
+    rng = np.random.default_rng(1)
+    centers = rng.uniform((-250, -250, 100), (250, 250, 300), (2000, 3))
+    angles, steps, valid, status = inverse_kinematics_batch(centers)
+
+    # Targets as far from an already cached grid point as the cell allows
+    targets = np.round(centers[valid] / 0.5) * 0.5
+    targets += rng.choice((-0.2499, 0.2499), targets.shape)
+    for target in targets:
+        cache.solve(*target)
+    solutions = np.array([cache.solve(*target)[:4] for target in targets])
+    assert cache.stats()['hits'] >= len(targets)
+
+    end, points, above_ground = forward_kinematics_batch(solutions, 152.794, 157.76, 90)
+    error = np.linalg.norm(end - targets, axis=1)
+    assert error.max() <= cache.tolerance + 1e-9
+    assert error.max() > 0.9 * cache.tolerance
+
+
+def test_cache_hits_repeated_target():
+    cache = IKCache()
+    for _ in range(3):
+        assert cache.solve(3, 203, 258) == inverse_kinematics(3, 203, 258)
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['size'] == 1
+
+    with pytest.raises(ValueError):
+        cache.solve(1000, 0, 0)
+    with pytest.raises(ValueError):
+        cache.solve(1000, 0, 0)
+    assert cache.stats()['hits'] == 3
+
+
+def test_cache_is_invalidated_by_link_lengths():
+    cache = IKCache()
+    cache.solve(3, 203, 258)
+    assert cache.solve(3, 203, 258, a2=150.0) == inverse_kinematics(3, 203, 258, a2=150.0)
+    assert cache.stats()['invalidations'] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import cv2
+import numpy as np
+from ws.frame_processor import FrameProcessor, pack_frame_data
+from ws.stream_control import StreamQualityController
+from ws.ws import WebSocketClient
+
+
+def stereo_payload():
+    image = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    jpeg = cv2.imencode('.jpg', image)[1].tobytes()
+    return pack_frame_data(jpeg, jpeg)
+
+
+async def feed(client, payload, rate, duration):
+    """Dispatch frames to the client as its receive loop would"""
+    for _ in range(int(rate * duration)):
+        client._dispatch_frame(payload, time.perf_counter())
+        await asyncio.sleep(1.0 / rate)
+
+
+async def drain(client):
+    """Let the frames still in flight finish before the event loop closes"""
+    while client.inflight_frames or client.pending_frames:
+        await asyncio.gather(*client.inflight_frames, return_exceptions=True)
+
+
+def test_overloaded_client_downgrades_stream():
+    processor = FrameProcessor(decode_scale=8)
+
+    # 10x overload: frames arrive at 100 Hz and take 0.1 s to process
+    def slow_process(frame0, frame1):
+        time.sleep(0.1)
+        return frame0, frame1
+    processor._process_frames = slow_process
+
+    async def run():
+        client = WebSocketClient("ws://localhost:1", frame_callback=processor.decode_and_process)
+        controller = StreamQualityController(client, processor)
+        await feed(client, stereo_payload(), rate=100, duration=1.0)
+        downgraded = controller.update()
+        await drain(client)
+        return client, controller, downgraded
+
+    client, controller, downgraded = asyncio.run(run())
+    assert client.frame_stats()['dropped_oldest'] > 0
+    assert downgraded
+    assert controller.level == 1
+
+
+def test_calm_client_keeps_stream():
+    processor = FrameProcessor(decode_scale=8)
+
+    async def run():
+        client = WebSocketClient("ws://localhost:1", frame_callback=processor.decode_and_process)
+        controller = StreamQualityController(client, processor)
+        await feed(client, stereo_payload(), rate=10, duration=1.0)
+        await drain(client)
+        return controller, controller.update()
+
+    controller, changed = asyncio.run(run())
+    assert not changed
+    assert controller.level == 0
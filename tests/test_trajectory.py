@@ -0,0 +1,51 @@
+import asyncio
+import numpy as np
+import pytest
+from robot.trajectory import STEPS_PER_RADIAN, CommandedPose, TrajectoryPlanner, stream_trajectory
+
+
+def test_move_across_negative_x_axis_is_rejected():
+    # The straight line passes the base just off the negative x axis, where theta1 wraps
+    planner = TrajectoryPlanner()
+    with pytest.raises(ValueError, match="negative x axis"):
+        planner.plan(([3, 203, 258], [-19, -57, 270]))
+
+
+def test_retiming_is_capped():
+    # Sweeping past the base axis needs a very slow joint 1, more than max_duration allows
+    planner = TrajectoryPlanner(max_duration=30.0)
+    with pytest.raises(ValueError, match="would take"):
+        planner.plan(([3, 203, 258], [3, -203, 258]))
+
+
+def test_trajectory_respects_joint_limits():
+    planner = TrajectoryPlanner()
+    trajectory = planner.plan(([3, 203, 258], [150, 150, 258]))
+
+    np.testing.assert_allclose(trajectory.points[[0, -1]], [[3, 203, 258], [150, 150, 258]])
+    assert trajectory.duration <= planner.max_duration
+    dt = trajectory.times[1] - trajectory.times[0]
+    velocity = np.abs(np.diff(trajectory.angles * STEPS_PER_RADIAN, axis=0)).max(axis=0) / dt
+    assert (velocity <= planner.max_joint_velocity).all()
+
+
+def test_replanning_starts_from_last_sent_waypoint():
+    planner = TrajectoryPlanner()
+    commanded = CommandedPose()
+    commanded.update((3, 203, 258), (0.0, 0.0, 0.0, 0.0))
+    sent = []
+
+    async def run():
+        # Interrupt the first move halfway, as a new typed target would
+        task = asyncio.ensure_future(stream_trajectory(planner.plan((commanded.point, (150, 150, 258))),
+                                                       sent.append, commanded))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        return planner.plan((commanded.point, (200, 100, 258)))
+
+    trajectory = asyncio.run(run())
+    assert 0 < len(sent)
+    assert commanded.point != (150.0, 150.0, 258.0)
+    # The new move begins exactly where the arm was last told to go, so its first sent step is a small one
+    assert trajectory.steps[0].tolist() == sent[-1]
+    assert np.abs(trajectory.steps[1] - trajectory.steps[0]).max() < 100
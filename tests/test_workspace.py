@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from robot.kinematics import inverse_kinematics_batch
+from robot.robot import Robot
+from robot.workspace import DEFAULT_BOUNDS, VOXEL_BOUNDARY, VOXEL_INSIDE, build_workspace
+
+
+@pytest.fixture(scope="module")
+def workspace(tmp_path_factory):
+    return build_workspace(str(tmp_path_factory.mktemp("workspace")), resolution=10.0)
+
+
+def sample_targets(count, seed=0):
+    low = np.array([low for low, high in DEFAULT_BOUNDS])
+    high = np.array([high for low, high in DEFAULT_BOUNDS])
+    return np.random.default_rng(seed).uniform(low, high, (count, 3))
+
+
+def test_solvable_targets_are_never_outside(workspace):
+    # Uniform samples plus samples near the base axis and near full reach, where the
+    # valid regions are too thin for the grid samples to find
+    rng = np.random.default_rng(1)
+    direction = rng.normal(size=(200_000, 3))
+    direction /= np.linalg.norm(direction, axis=1)[:, None]
+    targets = np.concatenate((
+        sample_targets(1_000_000),
+        np.column_stack((rng.uniform(-15, 15, (200_000, 2)), rng.uniform(0, 500, 200_000))),
+        np.array([0, 0, 90]) + direction * rng.uniform(307, 310.5, 200_000)[:, None],
+    ))
+    angles, steps, valid, status = inverse_kinematics_batch(targets)
+    solvable = targets[valid]
+    assert len(solvable) > 10_000
+
+    assert np.count_nonzero(workspace.classify(solvable) == 0) == 0
+    assert np.count_nonzero(workspace.classify(targets[~valid]) == VOXEL_INSIDE) == 0
+
+
+def test_reachability_agrees_with_ik(workspace):
+    # Robot.is_reachable answers through the IK cache, i.e. for the target's grid point
+    targets = sample_targets(100_000)
+    robot = Robot(workspace)
+    grid_points = np.round(targets / robot.ik_cache.resolution) * robot.ik_cache.resolution
+    angles, steps, valid, status = inverse_kinematics_batch(grid_points)
+    assert [robot.is_reachable(*target) for target in targets[valid]] == [True] * np.count_nonzero(valid)
+
+    boundary = workspace.classify(targets) == VOXEL_BOUNDARY
+    assert [robot.is_reachable(*target) for target in targets[boundary]] == valid[boundary].tolist()
+
+
+def test_outside_target_is_rejected_without_ik(workspace, monkeypatch):
+    def no_ik(*args, **kwargs):
+        raise AssertionError("IK was solved for a target outside the workspace")
+    arm = Robot(workspace)
+    monkeypatch.setattr(arm.ik_cache, "solve", no_ik)
+
+    assert workspace.classify((390.0, 390.0, 10.0))[0] == 0
+    assert not arm.is_reachable(390.0, 390.0, 10.0)
+
+
+def test_unreachable_target_is_rejected(workspace):
+    with pytest.raises(ValueError):
+        Robot(workspace).update_robot(390.0, 390.0, 10.0)
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from ws.latency import LatencyTracker
+
+
+class CommandTracker:
+    def __init__(self, timeout=0.5, max_retries=1, window=1000):
+        """
+        Track servo commands until the robot acknowledges them.
+
+        Each sent command carries a message id, the firmware echoes the id once the command
+        has been applied. The time between sending and the acknowledgement is recorded per
+        message type, commands that are not acknowledged within the timeout are reported by
+        expire() so the client can resend or escalate them.
+
+        Args:
+            timeout (float): Time in seconds to wait for an acknowledgement
+            max_retries (int): How many times an unacknowledged command is resent before escalating
+            window (int): Number of most recent round trips kept per message type
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.latency = LatencyTracker(window)
+        # Maps message id to (message_type, commands, t_sent, attempt), in send order
+        self.outstanding = OrderedDict()
+        self.sent_count = 0
+        self.acked_count = 0
+        self.timeout_count = 0
+        self.retry_count = 0
+        self.escalation_count = 0
+        self.unknown_ack_count = 0
+
+    def track(self, message_id, message_type, commands, attempt=0):
+        """
+        Start waiting for the acknowledgement of a sent command.
+
+        Args:
+            message_id (int): Id the command was sent with
+            message_type (str): Type of message ('msg-servo-st', 'msg-servo-9g')
+            commands (dict): Servo targets carried by the message, servo id to target values
+            attempt (int): 0 for the first send, then the retry number
+        """
+        self.outstanding[message_id] = (message_type, dict(commands), time.perf_counter(), attempt)
+        self.sent_count += 1
+
+    def acknowledge(self, message_id):
+        """
+        Handle an acknowledgement from the robot.
+
+        Args:
+            message_id (int): Acknowledged message id
+
+        Returns:
+            float: Round-trip time in seconds, or None if the id is unknown or already timed out
+        """
+        entry = self.outstanding.pop(message_id, None)
+        if entry is None:
+            self.unknown_ack_count += 1
+            return None
+        message_type, commands, t_sent, attempt = entry
+        rtt = time.perf_counter() - t_sent
+        self.latency.record(message_type, rtt)
+        self.acked_count += 1
+        return rtt
+
+    def expire(self):
+        """
+        Remove commands whose acknowledgement is overdue.
+
+        Returns:
+            tuple: (retry, escalate), lists of (message_id, message_type, commands, attempt)
+                to resend with attempt + 1, and of commands that ran out of retries
+        """
+        now = time.perf_counter()
+        retry, escalate = [], []
+        # Ids are tracked in send order, so the oldest entries expire first
+        while self.outstanding:
+            message_id, (message_type, commands, t_sent, attempt) = next(iter(self.outstanding.items()))
+            if now - t_sent < self.timeout:
+                break
+            del self.outstanding[message_id]
+            self.timeout_count += 1
+            if attempt < self.max_retries:
+                self.retry_count += 1
+                retry.append((message_id, message_type, commands, attempt))
+            else:
+                self.escalation_count += 1
+                escalate.append((message_id, message_type, commands, attempt))
+        return retry, escalate
+
+    def stats(self):
+        """
+        Get acknowledgement counters and round-trip statistics.
+
+        Returns:
+            dict: Counters, and 'rtt' mapping message type to {'count', 'p50', 'p95', 'p99', 'max'} in milliseconds
+        """
+        return {
+            'sent': self.sent_count,
+            'acked': self.acked_count,
+            'outstanding': len(self.outstanding),
+            'timeouts': self.timeout_count,
+            'retries': self.retry_count,
+            'escalations': self.escalation_count,
+            'unknown_acks': self.unknown_ack_count,
+            'rtt': self.latency.summary(),
+        }
+
+    def dump(self):
+        """Print the round-trip table and counters"""
+        stats = self.stats()
+        self.latency.dump()
+        print(f"[i] Commands: {stats['sent']} sent, {stats['acked']} acked, {stats['timeouts']} timed out, "
+              f"{stats['retries']} retried, {stats['escalations']} escalated, {stats['unknown_acks']} unknown acks")
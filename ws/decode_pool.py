@@ -0,0 +1,171 @@
+import atexit
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from camera.distortion import K1, D1, K2, D2, display_w, display_h, scaled_intrinsics, undistort_maps
+
+# Calibration for each camera slot
+CAMERA_CALIBRATION = ((K1, D1), (K2, D2))
+
+
+def _decode_worker(camera_index, shm_name, payload_size, decode_flag, task_queue, result_queue):
+    """
+    Worker process that decodes and undistorts the frames of one camera.
+
+    The JPEG is read from the input region of the shared-memory slot and the undistorted
+    frame is written straight into the output region, only shapes travel over the queues.
+    """
+    K, D = CAMERA_CALIBRATION[camera_index]
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            task_id, length = task
+            try:
+                jpeg = np.frombuffer(shm.buf, dtype=np.uint8, count=length)
+                frame = cv2.imdecode(jpeg, decode_flag)
+                del jpeg
+                if frame is None:
+                    result_queue.put((task_id, camera_index, None))
+                    continue
+
+                h, w = frame.shape[:2]
+                map1, map2 = undistort_maps(scaled_intrinsics(K, (w, h)), D, (w, h))
+                shape = map1.shape[:2] + frame.shape[2:]
+                out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=payload_size)
+                cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=out)
+                del out
+                result_queue.put((task_id, camera_index, shape))
+            except Exception as e:
+                print(f"[-] Error in decode worker {camera_index}: {e}")
+                result_queue.put((task_id, camera_index, None))
+    finally:
+        shm.close()
+
+
+class DecodePool:
+    def __init__(self, decode_flag=cv2.IMREAD_COLOR, decode_scale=1, max_payload_size=8 * 1024 * 1024, timeout=5.0):
+        """
+        Decode and undistort stereo frames in worker processes, one per camera, so the work
+        doesn't compete for the GIL with the GUI and WebSocket loop.
+
+        Each camera has a shared-memory slot holding the JPEG payload followed by the
+        undistorted output frame; frames are never pickled.
+
+        Args:
+            decode_flag (int): cv2.imdecode flag, see DECODE_FLAGS in ws.frame_processor
+            decode_scale (int): JPEG reduction factor matching decode_flag, used to size the slots
+            max_payload_size (int): Largest JPEG in bytes that fits in a slot
+            timeout (float): Time in seconds to wait for the workers before giving up on a pair
+        """
+        self.payload_size = max_payload_size
+        self.timeout = timeout
+        self.task_id = 0
+        # Task id each worker was given and hasn't answered yet; its slot is not rewritten until it does
+        self.outstanding = [None] * len(CAMERA_CALIBRATION)
+
+        # Undistortion crops the decoded frame, so the decoded size bounds the output
+        frame_size = (display_w // decode_scale + 1) * (display_h // decode_scale + 1) * 3
+
+        # spawn avoids forking a process that already runs threads
+        context = multiprocessing.get_context("spawn")
+        self.result_queue = context.Queue()
+        self.slots = []
+        self.task_queues = []
+        self.workers = []
+        for camera_index in range(len(CAMERA_CALIBRATION)):
+            shm = shared_memory.SharedMemory(create=True, size=self.payload_size + frame_size)
+            task_queue = context.Queue()
+            worker = context.Process(
+                target=_decode_worker,
+                args=(camera_index, shm.name, self.payload_size, decode_flag, task_queue, self.result_queue),
+                daemon=True
+            )
+            worker.start()
+            self.slots.append(shm)
+            self.task_queues.append(task_queue)
+            self.workers.append(worker)
+
+        self.closed = False
+        atexit.register(self.close)
+        print(f"[+] Started {len(self.workers)} decode worker processes")
+
+    def decode(self, jpeg0, jpeg1):
+        """
+        Decode and undistort a stereo pair in the worker processes.
+
+        The returned frames are views into shared memory and stay valid until the next call.
+
+        Args:
+            jpeg0 (bytes-like): JPEG data from camera 0
+            jpeg1 (bytes-like): JPEG data from camera 1
+
+        Returns:
+            tuple: Undistorted frames (frame0, frame1), None for a frame that failed to decode
+
+        Raises:
+            RuntimeError: If the workers don't answer in time, or are still busy with a pair
+                that timed out earlier
+        """
+        for jpeg in (jpeg0, jpeg1):
+            if len(jpeg) > self.payload_size:
+                raise ValueError(f"Frame of {len(jpeg)} bytes does not fit in a {self.payload_size} byte slot")
+
+        # A worker that timed out may still be reading its slot, wait for it before rewriting the slot
+        while any(task_id is not None for task_id in self.outstanding):
+            try:
+                self._collect()
+            except queue.Empty:
+                raise RuntimeError("Decode workers are still busy with a pair that timed out")
+
+        self.task_id += 1
+        for camera_index, jpeg in enumerate((jpeg0, jpeg1)):
+            length = len(jpeg)
+            self.slots[camera_index].buf[:length] = jpeg
+            self.outstanding[camera_index] = self.task_id
+            self.task_queues[camera_index].put((self.task_id, length))
+
+        frames = [None, None]
+        pending = len(frames)
+        while pending:
+            try:
+                task_id, camera_index, shape = self._collect()
+            except queue.Empty:
+                raise RuntimeError("Decode workers did not respond in time")
+            if task_id != self.task_id:
+                continue  # Late result from a pair that timed out
+            pending -= 1
+            if shape is not None:
+                frames[camera_index] = np.ndarray(shape, dtype=np.uint8,
+                                                  buffer=self.slots[camera_index].buf, offset=self.payload_size)
+        return frames[0], frames[1]
+
+    def _collect(self):
+        """Take one worker result, releasing the worker's slot, queue.Empty after the timeout"""
+        task_id, camera_index, shape = self.result_queue.get(timeout=self.timeout)
+        if self.outstanding[camera_index] == task_id:
+            self.outstanding[camera_index] = None
+        return task_id, camera_index, shape
+
+    def close(self):
+        """Stop the worker processes and release the shared memory"""
+        if self.closed:
+            return
+        self.closed = True
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=1.0)
+            if worker.is_alive():
+                worker.terminate()
+        for shm in self.slots:
+            try:
+                shm.close()
+                shm.unlink()
+            except BufferError:
+                # Frames handed out by decode() still reference the buffer
+                shm.unlink()
@@ -1,128 +1,247 @@
+import asyncio
 import struct
+from collections import namedtuple
 import cv2
 import numpy as np
-from camera.distortion import distortion
-from camera.detection import yolo, yolo1
-import os
+from camera.distortion import distortion, display_w, display_h, roi1, roi2
+from camera.detection import get_detector
+import time
 from datetime import datetime
-import concurrent.futures
 import threading
-import queue
+from ws.mailbox import Mailbox
+from ws.decode_pool import DecodePool
+from ws.recording import FrameRecorder
+from ws.latency import pipeline_latency
+
+# imdecode flags for libjpeg DCT-domain downscaling, keyed on the reduction factor
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def select_decode_scale(target_size):
+    """
+    Pick the largest JPEG reduction factor whose undistorted output still covers target_size.
+
+    Args:
+        target_size (tuple): Smallest (width, height) any downstream consumer needs
+
+    Returns:
+        int: Reduction factor (1, 2, 4 or 8)
+    """
+    target_w, target_h = target_size
+
+    # The undistorted frame is cropped to the ROI, so size against the smaller crop
+    source_w = min(roi1[2], roi2[2]) or display_w
+    source_h = min(roi1[3], roi2[3]) or display_h
+
+    best_scale = 1
+    for scale in sorted(DECODE_FLAGS):
+        if source_w // scale >= target_w and source_h // scale >= target_h:
+            best_scale = scale
+    return best_scale
+
+
+# Length prefix of each JPEG in the stereo payload
+FRAME_HEADER = struct.Struct('>I')
+
+# Result of one stereo pair: the processed frames (None if the pair was dropped or could not
+# be decoded), the pair's sequence number and its time.perf_counter() arrival time
+ProcessedFrames = namedtuple('ProcessedFrames', ('frame0', 'frame1', 'sequence', 't_arrival'))
+
+
+def parse_frame_data(data):
+    """
+    Split binary frame data received from WebSocket into the two JPEG payloads.
+    
+    The payload is two length-prefixed JPEGs: [len0][jpeg0][len1][jpeg1], lengths are
+    big-endian uint32. The JPEGs are returned as memoryview slices, so nothing is copied.
+    
+    Args:
+        data (bytes): Raw binary data containing frames from both cameras
+        
+    Returns:
+        tuple: JPEG data from both cameras (img0, img1), or None if the payload is malformed
+    """
+    view = memoryview(data)
+    total = len(view)
+    header = FRAME_HEADER.size
+    
+    # Extract first frame length and data
+    if total < header:
+        return None
+    len0 = FRAME_HEADER.unpack_from(view, 0)[0]
+    offset = header
+    if len0 == 0 or offset + len0 + header > total:
+        return None
+    img0 = view[offset:offset + len0]
+    offset += len0
+    
+    # Extract second frame length and data
+    len1 = FRAME_HEADER.unpack_from(view, offset)[0]
+    offset += header
+    if len1 == 0 or offset + len1 != total:
+        return None
+    img1 = view[offset:offset + len1]
+    
+    return img0, img1
+
+
+def pack_frame_data(jpeg0, jpeg1):
+    """
+    Build a stereo payload in the format parse_frame_data expects.
+    
+    Args:
+        jpeg0 (bytes-like): JPEG data from camera 0
+        jpeg1 (bytes-like): JPEG data from camera 1
+        
+    Returns:
+        bytes: Length-prefixed stereo payload
+    """
+    return b"".join((FRAME_HEADER.pack(len(jpeg0)), jpeg0, FRAME_HEADER.pack(len(jpeg1)), jpeg1))
+
 
 class FrameProcessor:
-    def __init__(self, save_frames=False, max_queue_size=5):
+    def __init__(self, save_frames=False, target_size=None, decode_scale=None, use_processes=False):
         """
         Initialize the frame processor that handles decoding and processing camera frames.
         
         Args:
-            save_frames (bool): Whether to save frames to disk for debugging/analysis
-            max_queue_size (int): Maximum size of the processing queue
+            save_frames (bool): Whether to record the received JPEGs to disk for debugging/analysis/replay
+            target_size (tuple): Smallest (width, height) needed downstream (detector input,
+                GUI preview). When given, JPEGs are decoded at the smallest scale covering it.
+            decode_scale (int): Explicit JPEG reduction factor (1, 2, 4 or 8), overrides target_size
+            use_processes (bool): Decode and undistort in worker processes through shared memory
+                instead of in this process
         """
+        if decode_scale is None:
+            decode_scale = select_decode_scale(target_size) if target_size else 1
+        if decode_scale not in DECODE_FLAGS:
+            raise ValueError(f"Unsupported decode scale: {decode_scale}")
+        self.decode_scale = decode_scale
+        self.decode_flag = DECODE_FLAGS[decode_scale]
+        print(f"[+] Decoding frames at 1/{decode_scale} scale")
+        
+        # Optional multiprocess decode/undistort stage
+        self.decode_pool = DecodePool(self.decode_flag, decode_scale) if use_processes else None
+
         self.save_frames = save_frames
-        self.frame_count = 0
-        self.processing_queue = queue.Queue(maxsize=max_queue_size)
-        self.result_queue = queue.Queue(maxsize=max_queue_size)
         
-        # Create a thread pool executor
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        # Single-slot handoff: a newer pair replaces an unprocessed older one. Each pair carries
+        # the future its caller waits on, resolved with the result or (None, None) if it was dropped
+        self.input_mailbox = Mailbox()
+        self.sequence = 0  # Sequence number of the last received pair
+        self.result_sequence = 0  # Sequence number of the latest published result, each result carries its own
+        self.result_arrival = None  # Arrival time of the pair behind the latest published result
+        self.malformed_frames = 0  # Pairs rejected because of a bad header or undecodable JPEG
         
         # Start the processing thread
         self.processing_thread = threading.Thread(target=self._processing_worker, daemon=True)
         self.processing_thread.start()
         
-        # Set up directories for saving frames if needed
+        # Record the original JPEG payloads if needed
+        self.recorder = None
         if self.save_frames:
             self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.camera0_dir = f"camera0_frames_{self.timestamp}"
-            self.camera1_dir = f"camera1_frames_{self.timestamp}"
-            
-            os.makedirs(self.camera0_dir, exist_ok=True)
-            os.makedirs(self.camera1_dir, exist_ok=True)
-            
-            print(f"[+] Saving frames from camera 0 to folder: {self.camera0_dir}")
-            print(f"[+] Saving frames from camera 1 to folder: {self.camera1_dir}")
+            self.recorder = FrameRecorder(f"frames_{self.timestamp}.rec")
+    
+    @property
+    def dropped_frames(self):
+        """Number of received pairs replaced by a newer pair before they were processed"""
+        return self.input_mailbox.replaced_count
     
     def _processing_worker(self):
-        """Worker thread that processes frames from the queue"""
+        """Worker thread that always processes the most recent pair from the input mailbox"""
         while True:
+            waiter = None
             try:
-                # Get a task from the queue
-                task_type, data = self.processing_queue.get()
+                # Wait for the latest pair
+                sequence, t_arrival, data, waiter = self.input_mailbox.get()
+                pipeline_latency.record("queue_wait", time.perf_counter() - t_arrival)
+                
+                # Validate the headers and split the payload without copying
+                with pipeline_latency.measure("parse"):
+                    payloads = parse_frame_data(data)
+                if payloads is None:
+                    self.malformed_frames += 1
+                    self._resolve(waiter, ProcessedFrames(None, None, sequence, t_arrival))
+                    continue
                 
-                if task_type == "decode":
-                    # Decode the frame data
-                    frame0, frame1 = self._decode_frame_data(data)
-                    
-                    # If saving is enabled, submit a separate save task
-                    if self.save_frames:
-                        self.executor.submit(self._save_frames, frame0, frame1)
-                    
-                    # Process the frames in a separate thread and get a future
-                    future = self.executor.submit(self._process_frames, frame0, frame1)
-                    
-                    # Add the result to the result queue when done
-                    processed_frames = future.result()
-                    self.result_queue.put(processed_frames)
+                # Decode the frame data
+                frame0, frame1 = self._decode_frame_data(*payloads)
+                if frame0 is None or frame1 is None:
+                    self.malformed_frames += 1
+                    self._resolve(waiter, ProcessedFrames(None, None, sequence, t_arrival))
+                    continue
                 
-                # Mark task as done
-                self.processing_queue.task_done()
+                # Process the frames and hand the result to the caller waiting for this pair
+                processed_frames = self._process_frames(frame0, frame1)
+                if self.decode_pool:
+                    processed_frames = self._detach(*processed_frames)
+                self.result_sequence = sequence
+                self.result_arrival = t_arrival
+                # From the pair reaching the processor to its result being published
+                pipeline_latency.record("total", time.perf_counter() - t_arrival)
+                self._resolve(waiter, ProcessedFrames(*processed_frames, sequence, t_arrival))
             
             except Exception as e:
                 print(f"Error in processing worker: {e}")
-                # Mark task as done even if there was an error
-                self.processing_queue.task_done()
+                if waiter is not None:
+                    self._resolve(waiter, ProcessedFrames(None, None, sequence, t_arrival))
     
-    def _decode_frame_data(self, data):
+    @staticmethod
+    def _set_result(future, result):
+        # The caller may have been cancelled in the meantime
+        if not future.done():
+            future.set_result(result)
+    
+    def _resolve(self, waiter, result):
+        """Complete the future of a pair from the worker thread"""
+        loop, future = waiter
+        loop.call_soon_threadsafe(self._set_result, future, result)
+    
+    def _detach(self, frame0, frame1):
+        """Copy frames that still point into the decode pool's shared memory"""
+        if not self.decode_pool:
+            return frame0, frame1
+        return tuple(
+            frame.copy() if frame is not None and not frame.flags.owndata else frame
+            for frame in (frame0, frame1)
+        )
+    
+    def _decode_frame_data(self, img0, img1):
         """
-        Decode binary frame data received from WebSocket.
+        Decode the JPEG payloads of a stereo pair.
         
         Args:
-            data (bytes): Raw binary data containing frames from both cameras
+            img0 (memoryview): JPEG data from camera 0
+            img1 (memoryview): JPEG data from camera 1
             
         Returns:
-            tuple: A tuple containing frames from both cameras (frame0, frame1)
+            tuple: A tuple containing frames from both cameras (frame0, frame1),
+                None for a frame that failed to decode
         """
-        # Unpack data
-        offset = 0
-        
-        # Extract first frame length and data
-        len0 = struct.unpack('>I', data[offset:offset+4])[0]
-        offset += 4
-        img0 = np.frombuffer(data[offset:offset+len0], dtype=np.uint8)
-        offset += len0
-        
-        # Extract second frame length and data
-        len1 = struct.unpack('>I', data[offset:offset+4])[0]
-        offset += 4
-        img1 = np.frombuffer(data[offset:offset+len1], dtype=np.uint8)
+        if self.decode_pool:
+            # Decode and undistortion both happen in the worker processes
+            with pipeline_latency.measure("decode"):
+                return self.decode_pool.decode(img0, img1)
         
-        # Decode JPEG data to frames
-        frame0 = cv2.imdecode(img0, cv2.IMREAD_COLOR)
-        frame1 = cv2.imdecode(img1, cv2.IMREAD_COLOR)
+        # Decode JPEG data to frames, downscaled by libjpeg if a reduced tier is selected
+        with pipeline_latency.measure("decode"):
+            frame0 = cv2.imdecode(np.frombuffer(img0, dtype=np.uint8), self.decode_flag)
+            frame1 = cv2.imdecode(np.frombuffer(img1, dtype=np.uint8), self.decode_flag)
+        if frame0 is None or frame1 is None:
+            return frame0, frame1
         
-        # Apply distortion correction
-        frame0, frame1 = distortion(frame0, frame1)
+        # Apply distortion correction (intrinsics are rescaled to the decoded size)
+        with pipeline_latency.measure("distortion"):
+            frame0, frame1 = distortion(frame0, frame1)
         
         return frame0, frame1
     
-    def _save_frames(self, frame0, frame1):
-        """Save frames to disk if enabled"""
-        try:
-            frame_filename0 = os.path.join(self.camera0_dir, f"frame_{self.frame_count:06d}.jpg")
-            frame_filename1 = os.path.join(self.camera1_dir, f"frame_{self.frame_count:06d}.jpg")
-            
-            cv2.imwrite(frame_filename0, frame0)
-            cv2.imwrite(frame_filename1, frame1)
-            
-            self.frame_count += 1
-            
-            # Display progress every 100 frames
-            if self.frame_count % 100 == 0:
-                print(f"[+] Saved {self.frame_count} frames")
-        
-        except Exception as e:
-            print(f"Error saving frames: {e}")
-    
     def _process_frames(self, frame0, frame1):
         """
         Process frames with YOLO detection.
@@ -134,36 +253,53 @@ class FrameProcessor:
         Returns:
             tuple: A tuple containing processed frames from both cameras
         """
-        # Apply YOLO detection to frames
-        processed_frame0 = yolo.process_frame(frame0)
-        processed_frame1 = yolo1.process_frame(frame1)
+        # Pass frames through untouched until the model has finished loading
+        detector = get_detector()
+        if detector is None:
+            return frame0, frame1
+        
+        # Apply YOLO detection to both frames in one batched forward pass
+        processed_frame0, processed_frame1 = detector.process_frames([frame0, frame1])
         
         return processed_frame0, processed_frame1
     
+    def close(self):
+        """Stop the worker processes of the decode stage and finish the recording, if any"""
+        if self.decode_pool:
+            self.decode_pool.close()
+        if self.recorder:
+            self.recorder.close()
+    
     async def decode_and_process(self, data):
         """
         Asynchronous function to decode and process frames.
         This function doesn't block the async event loop as processing happens in separate threads.
         
+        It returns once the worker has finished this pair, so a caller limiting how many
+        calls run at once limits the pairs actually being processed. If a newer pair
+        replaces this one before the worker picks it up, it returns right away.
+        
         Args:
             data (bytes): Raw binary data containing frames from both cameras
             
         Returns:
-            tuple: A tuple containing processed frames from both cameras
+            ProcessedFrames: The processed frames from both cameras with the pair's sequence
+                number and arrival time, frames are None if the pair was dropped or could not
+                be decoded
         """
-        # Put the data in the processing queue
-        if not self.processing_queue.full():
-            self.processing_queue.put(("decode", data))
-        else:
-            print("Warning: Processing queue is full, skipping frame")
-            # If the queue is full, we need to return something
-            # Return None values that the caller should handle
-            return None, None
-        
-        # Check if we have processed frames available
-        if not self.result_queue.empty():
-            return self.result_queue.get()
-        else:
-            # If no processed frames are ready yet, return None values
-            # The caller should handle this case (e.g., by keeping previous frames)
-            return None, None
\ No newline at end of file
+        # Record the payload exactly as received
+        if self.recorder:
+            self.recorder.record(data, time.time())
+        
+        # Hand the pair to the worker, replacing an older pair it hasn't started on
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        t_arrival = time.perf_counter()
+        self.sequence += 1
+        replaced, dropped = self.input_mailbox.swap((self.sequence, t_arrival, data, (loop, future)))
+        if replaced:
+            # The worker never saw the older pair, release its caller
+            dropped_sequence, dropped_arrival, dropped_data, (dropped_loop, dropped_future) = dropped
+            self._set_result(dropped_future, ProcessedFrames(None, None, dropped_sequence, dropped_arrival))
+        
+        return await future
\ No newline at end of file
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Pipeline stages in the order a frame goes through them, each measured between these points:
+#   dispatch_wait   recv() has returned the whole message -> the frame callback starts
+#                   (event loop scheduling plus any wait for an in-flight slot). Time on the
+#                   network and in the socket buffers happens before recv() returns and is
+#                   not measured by any stage.
+#   queue_wait      decode_and_process() hands the pair over -> the worker picks it up
+#   parse           splitting the payload into the two JPEGs
+#   decode          JPEG decoding (and undistortion too when decoding in worker processes)
+#   distortion      undistortion in the worker thread
+#   inference       detector forward pass
+#   annotation      drawing the detections
+#   gui_conversion  resizing and converting the result for Tk, in the GUI's callback
+#   display         handing the images to the Tk labels
+#   total           decode_and_process() hands the pair over -> the worker publishes the result,
+#                   i.e. queue_wait through annotation
+STAGES = ("dispatch_wait", "queue_wait", "parse", "decode", "distortion", "inference", "annotation",
+          "gui_conversion", "display", "total")
+
+
+class LatencyTracker:
+    def __init__(self, window=1000):
+        """
+        Rolling per-stage latency histograms.
+
+        Each stage keeps its last `window` samples, measured with the monotonic
+        time.perf_counter() clock, and reports percentiles over them.
+
+        Args:
+            window (int): Number of most recent samples kept per stage
+        """
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """
+        Add a sample for a stage.
+
+        Args:
+            stage (str): Stage name, see STAGES
+            seconds (float): Duration of the stage
+        """
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._counts[stage] = 0
+            samples.append(seconds)
+            self._counts[stage] += 1
+
+    @contextmanager
+    def measure(self, stage):
+        """Time the body of a with-block as one sample of a stage"""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t_start)
+
+    def percentiles(self, stage, percents=(50, 95, 99)):
+        """
+        Get latency percentiles for a stage.
+
+        Args:
+            stage (str): Stage name
+            percents (tuple): Percentiles to compute
+
+        Returns:
+            dict: Maps each percentile to its latency in seconds, empty if there are no samples
+        """
+        with self._lock:
+            samples = np.array(self._samples.get(stage, ()))
+        if len(samples) == 0:
+            return {}
+        return dict(zip(percents, np.percentile(samples, percents)))
+
+    def summary(self):
+        """
+        Get statistics for every stage that has samples.
+
+        Returns:
+            dict: Maps stage name to {'count', 'p50', 'p95', 'p99', 'max'}, latencies in milliseconds
+        """
+        with self._lock:
+            snapshot = {stage: (np.array(samples), self._counts[stage]) for stage, samples in self._samples.items()}
+
+        # Known stages in pipeline order, then any extra ones
+        order = [stage for stage in STAGES if stage in snapshot] + sorted(set(snapshot) - set(STAGES))
+        stats = {}
+        for stage in order:
+            samples, count = snapshot[stage]
+            if len(samples) == 0:
+                continue
+            p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1000
+            stats[stage] = {
+                'count': count,
+                'p50': p50,
+                'p95': p95,
+                'p99': p99,
+                'max': samples.max() * 1000,
+            }
+        return stats
+
+    def dump(self):
+        """Print a latency table for all stages"""
+        stats = self.summary()
+        if not stats:
+            print("[i] No latency samples recorded")
+            return
+        print(f"{'stage':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage, s in stats.items():
+            print(f"{stage:<16}{s['count']:>8}{s['p50']:>10.2f}{s['p95']:>10.2f}{s['p99']:>10.2f}{s['max']:>10.2f}")
+
+    def reset(self):
+        """Drop all samples"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+# Shared tracker for the frame pipeline
+pipeline_latency = LatencyTracker()
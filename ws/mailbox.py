@@ -0,0 +1,68 @@
+import threading
+
+
+class Mailbox:
+    def __init__(self):
+        """
+        Single-slot "latest wins" handoff between threads.
+
+        Putting a new item replaces an older one that hasn't been taken yet,
+        so the consumer always gets the most recent item and never a backlog.
+        """
+        self._condition = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self.replaced_count = 0  # Items overwritten before they were taken
+
+    def put(self, item):
+        """
+        Store an item, replacing any item that hasn't been taken yet.
+
+        Args:
+            item: Item to hand off
+
+        Returns:
+            bool: True if an older item was replaced
+        """
+        return self.swap(item)[0]
+
+    def swap(self, item):
+        """
+        Store an item and hand back the one it replaced, so the producer can release it.
+
+        Args:
+            item: Item to hand off
+
+        Returns:
+            tuple: (replaced, old_item), old_item is None if nothing was replaced
+        """
+        with self._condition:
+            replaced = self._has_item
+            old_item = self._item if replaced else None
+            if replaced:
+                self.replaced_count += 1
+            self._item = item
+            self._has_item = True
+            self._condition.notify()
+        return replaced, old_item
+
+    def get(self, timeout=None):
+        """
+        Take the latest item, waiting until one is available.
+
+        Args:
+            timeout (float): Maximum time in seconds to wait, None waits forever
+
+        Returns:
+            The latest item, or None if the timeout expired
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._has_item, timeout):
+                return None
+            return self._take()
+
+    def _take(self):
+        item = self._item
+        self._item = None
+        self._has_item = False
+        return item
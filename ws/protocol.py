@@ -0,0 +1,150 @@
+import struct
+import numpy as np
+
+# Binary servo command / telemetry protocol
+#
+# Every message starts with a fixed 8-byte little-endian header:
+#   magic (2s) | version (uint8) | message id (uint8) | sequence (uint16) | payload length (uint16)
+# followed by a packed array of fixed-size records, the record layout depends on the message id.
+# Stereo frames start with a big-endian uint32 JPEG length, which can never begin with MAGIC,
+# so both kinds of binary message can share the WebSocket.
+MAGIC = b"FL"
+VERSION = 1
+HEADER = struct.Struct('<2sBBHH')
+
+MSG_SERVO_ST = 0x01   # Bus servo step targets
+MSG_SERVO_9G = 0x02   # Hobby servo angle targets
+MSG_TELEMETRY = 0x10  # Servo telemetry
+MSG_ACK = 0x11        # Acknowledged command sequences
+
+SERVO_ST_DTYPE = np.dtype([('id', 'u1'), ('position', '<i2')])
+SERVO_9G_DTYPE = np.dtype([('id', 'u1'), ('angle', 'u1'), ('step_delay', '<f4'), ('step_size', 'u1')])
+TELEMETRY_DTYPE = np.dtype([('id', 'u1'), ('voltage', '<f4'), ('current', '<f4'), ('temperature', '<f4'),
+                            ('position', '<i2'), ('load', '<f4')])
+ACK_DTYPE = np.dtype([('sequence', '<u2')])
+
+# Record layout and message id for each message type used by WebSocketClient
+MESSAGE_IDS = {
+    'msg-servo-st': MSG_SERVO_ST,
+    'msg-servo-9g': MSG_SERVO_9G,
+}
+RECORD_DTYPES = {
+    MSG_SERVO_ST: SERVO_ST_DTYPE,
+    MSG_SERVO_9G: SERVO_9G_DTYPE,
+    MSG_TELEMETRY: TELEMETRY_DTYPE,
+    MSG_ACK: ACK_DTYPE,
+}
+
+# Text acknowledgement sent by firmware for commands carrying a message id, e.g. "ack.17"
+TEXT_ACK = 'ack'
+
+
+class ProtocolError(ValueError):
+    """Raised for malformed binary protocol messages"""
+
+
+def is_protocol_message(data):
+    """Check whether a binary WebSocket message uses this protocol (as opposed to a stereo frame)"""
+    return len(data) >= HEADER.size and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_message(message_id, records, sequence=0):
+    """
+    Encode a binary message.
+
+    Args:
+        message_id (int): One of the MSG_* ids
+        records (np.ndarray or list): Records matching RECORD_DTYPES[message_id], lists of tuples are converted
+        sequence (int): Message sequence number, wraps at 16 bits
+
+    Returns:
+        bytes: Encoded message
+    """
+    dtype = RECORD_DTYPES[message_id]
+    records = np.asarray(records, dtype=dtype) if not isinstance(records, np.ndarray) else records.astype(dtype, copy=False)
+    payload = records.tobytes()
+    return HEADER.pack(MAGIC, VERSION, message_id, sequence & 0xFFFF, len(payload)) + payload
+
+
+def decode_message(data):
+    """
+    Decode a binary message.
+
+    Args:
+        data (bytes-like): Message received from the WebSocket
+
+    Returns:
+        tuple: (message_id, sequence, records) with records as a structured array (a view into data)
+    """
+    if len(data) < HEADER.size:
+        raise ProtocolError("Message shorter than the header")
+    magic, version, message_id, sequence, length = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ProtocolError("Bad magic")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version: {version}")
+    dtype = RECORD_DTYPES.get(message_id)
+    if dtype is None:
+        raise ProtocolError(f"Unknown message id: {message_id}")
+    if HEADER.size + length != len(data) or length % dtype.itemsize:
+        raise ProtocolError("Payload length does not match the header")
+    records = np.frombuffer(data, dtype=dtype, count=length // dtype.itemsize, offset=HEADER.size)
+    return message_id, sequence, records
+
+
+def encode_servo_command(message_type, commands, sequence=0):
+    """
+    Encode servo targets of one type into a single binary message.
+
+    Args:
+        message_type (str): 'msg-servo-st' or 'msg-servo-9g'
+        commands (dict): Maps servo id to its target values, (position,) for ST servos,
+            (angle, step_delay, step_size) for 9g servos
+        sequence (int): Message sequence number
+
+    Returns:
+        bytes: Encoded message
+    """
+    message_id = MESSAGE_IDS[message_type]
+    records = [(servo_id, *values) for servo_id, values in commands.items()]
+    return encode_message(message_id, records, sequence)
+
+
+def format_text_command(message_type, servo_id, values, message_id=None):
+    """
+    Format a servo target in the text protocol understood by older firmware,
+    e.g. "msg-servo-9g.*2,90,0.01,1*". With a message id the firmware is asked to
+    acknowledge the command: "msg-servo-9g.*2,90,0.01,1*#17".
+
+    Args:
+        message_type (str): 'msg-servo-st' or 'msg-servo-9g'
+        servo_id (int): Servo id (pin number for 9g servos)
+        values (tuple): Target values, see encode_servo_command
+        message_id (int): Id to acknowledge, None for fire-and-forget
+
+    Returns:
+        str: Text message
+    """
+    fields = ",".join(str(value) for value in (servo_id, *values))
+    if message_id is None:
+        return f"{message_type}.*{fields}*"
+    return f"{message_type}.*{fields}*#{message_id}"
+
+
+def parse_text_ack(message):
+    """
+    Parse a text acknowledgement.
+
+    Args:
+        message (str): Text message
+
+    Returns:
+        int: Acknowledged message id, or None if the message is not an acknowledgement
+    """
+    prefix = f"{TEXT_ACK}."
+    if not message.startswith(prefix):
+        return None
+    try:
+        return int(message[len(prefix):])
+    except ValueError:
+        return None
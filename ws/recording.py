@@ -0,0 +1,226 @@
+import asyncio
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+# Container layout:
+#   data file:  MAGIC, then records of [timestamp float64][length uint32][payload]
+#   index file: entries of [offset uint64][timestamp float64][length uint32], offset points at the payload
+# Both files are append-only, the index can be rebuilt from the data file if it is missing or short.
+MAGIC = b"FLREC\x01\n"
+RECORD_HEADER = struct.Struct('<dI')
+INDEX_ENTRY = struct.Struct('<QdI')
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('timestamp', '<f8'), ('length', '<u4')])
+
+
+def index_path(path):
+    """Path of the index file belonging to a recording"""
+    return path + ".idx"
+
+
+class FrameRecorder:
+    def __init__(self, path, max_pending=64):
+        """
+        Append raw stereo payloads, as received from the WebSocket, to a recording file.
+
+        Writing happens on a background thread, so recording never blocks the event loop.
+
+        Args:
+            path (str): Recording file to create
+            max_pending (int): Maximum number of payloads waiting to be written before new ones are dropped
+        """
+        self.path = path
+        self.recorded_count = 0
+        self.dropped_count = 0
+        self.pending = queue.Queue(maxsize=max_pending)
+
+        self.data_file = open(path, "wb")
+        self.index_file = open(index_path(path), "wb")
+        self.data_file.write(MAGIC)
+        self.offset = len(MAGIC)
+
+        self.writer_thread = threading.Thread(target=self._writer, daemon=True)
+        self.writer_thread.start()
+        print(f"[+] Recording frames to: {self.path}")
+
+    def record(self, data, timestamp=None):
+        """
+        Queue a payload for writing.
+
+        Args:
+            data (bytes): Raw binary data containing frames from both cameras
+            timestamp (float): Arrival time (time.time()), defaults to now
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        try:
+            self.pending.put_nowait((timestamp, data))
+        except queue.Full:
+            self.dropped_count += 1
+
+    def _writer(self):
+        """Writer thread appending queued payloads and their index entries"""
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            timestamp, data = item
+            try:
+                length = len(data)
+                self.data_file.write(RECORD_HEADER.pack(timestamp, length))
+                self.data_file.write(data)
+                self.offset += RECORD_HEADER.size
+                self.index_file.write(INDEX_ENTRY.pack(self.offset, timestamp, length))
+                self.offset += length
+                self.recorded_count += 1
+
+                # Display progress every 100 frames
+                if self.recorded_count % 100 == 0:
+                    self.data_file.flush()
+                    self.index_file.flush()
+                    print(f"[+] Recorded {self.recorded_count} frames")
+            except Exception as e:
+                print(f"Error recording frames: {e}")
+
+    def close(self):
+        """Write out the pending payloads and close the files"""
+        if self.data_file.closed:
+            return
+        self.pending.put(None)
+        self.writer_thread.join()
+        self.data_file.close()
+        self.index_file.close()
+        print(f"[+] Recorded {self.recorded_count} frames to {self.path} ({self.dropped_count} dropped)")
+
+
+class FrameRecording:
+    def __init__(self, path):
+        """
+        Random-access reader for a file written by FrameRecorder.
+
+        Args:
+            path (str): Recording file
+        """
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a frame recording: {path}")
+        self.index = self._load_index()
+
+    def _load_index(self):
+        """Load the index file, rebuilding it from the data file if it doesn't cover every record"""
+        size = os.path.getsize(self.path)
+        idx = index_path(self.path)
+        if os.path.exists(idx):
+            index = np.fromfile(idx, dtype=INDEX_DTYPE)
+            if len(index) and int(index['offset'][-1]) + int(index['length'][-1]) == size:
+                return index
+        return self._scan()
+
+    def _scan(self):
+        """Rebuild the index by walking the records, ignoring a truncated last record"""
+        size = os.path.getsize(self.path)
+        entries = []
+        offset = len(MAGIC)
+        self.file.seek(offset)
+        while offset + RECORD_HEADER.size <= size:
+            timestamp, length = RECORD_HEADER.unpack(self.file.read(RECORD_HEADER.size))
+            offset += RECORD_HEADER.size
+            if offset + length > size:
+                break
+            entries.append((offset, timestamp, length))
+            offset += length
+            self.file.seek(offset)
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        """
+        Read one record.
+
+        Returns:
+            tuple: (timestamp, data) with the arrival time and raw payload
+        """
+        offset, timestamp, length = self.index[i]
+        self.file.seek(int(offset))
+        return float(timestamp), self.file.read(int(length))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def duration(self):
+        """Time in seconds between the first and last record"""
+        if len(self) < 2:
+            return 0.0
+        return float(self.index['timestamp'][-1] - self.index['timestamp'][0])
+
+    def close(self):
+        self.file.close()
+
+
+class ReplaySource:
+    def __init__(self, path, speed=1.0, loop=False):
+        """
+        Feed a recording into the frame pipeline in place of the WebSocket.
+
+        Args:
+            path (str): Recording file written by FrameRecorder
+            speed (float): Playback speed relative to the recorded timing, None replays as fast as possible
+            loop (bool): Start over when the end of the recording is reached
+        """
+        self.recording = FrameRecording(path)
+        self.speed = speed
+        self.loop = loop
+        self.running = False
+        self.sent_count = 0
+
+    async def run(self, frame_callback):
+        """
+        Replay the recording.
+
+        Args:
+            frame_callback (callable): Async function called with each payload, like WebSocketClient's.
+                With a playback speed callbacks run in the background like frames from the socket,
+                so slow processing drops frames instead of slowing the replay down
+        """
+        if len(self.recording) == 0:
+            print(f"[-] Recording is empty: {self.recording.path}")
+            return
+
+        self.running = True
+        callbacks = set()
+        print(f"[+] Replaying {len(self.recording)} frames from {self.recording.path}")
+        while self.running:
+            start = time.monotonic()
+            first_timestamp = None
+            for timestamp, data in self.recording:
+                if not self.running:
+                    break
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                if self.speed:
+                    # Wait until this record is due relative to the start of the replay
+                    delay = (timestamp - first_timestamp) / self.speed - (time.monotonic() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    task = asyncio.ensure_future(frame_callback(data))
+                    callbacks.add(task)
+                    task.add_done_callback(callbacks.discard)
+                else:
+                    await frame_callback(data)
+                self.sent_count += 1
+            if not self.loop:
+                break
+        await asyncio.gather(*callbacks, return_exceptions=True)
+        self.running = False
+        print(f"[+] Replay finished, {self.sent_count} frames sent")
+
+    def stop(self):
+        self.running = False
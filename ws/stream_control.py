@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+# Stream settings requested from the camera server, best first: (JPEG quality, resolution scale, frame rate)
+QUALITY_LEVELS = (
+    (90, 1.0, 30),
+    (80, 1.0, 30),
+    (70, 1.0, 20),
+    (60, 0.75, 15),
+    (50, 0.5, 15),
+    (40, 0.5, 10),
+)
+
+# Text message type of stream control requests, the payload is JSON:
+#   stream-control.{"quality": 70, "scale": 1.0, "fps": 20}
+STREAM_CONTROL = 'stream-control'
+
+
+def format_stream_control(quality, scale, fps):
+    """Payload of a stream control request"""
+    return json.dumps({'quality': quality, 'scale': scale, 'fps': fps})
+
+
+def parse_stream_control(message):
+    """
+    Parse a stream control request received as a text message.
+
+    Args:
+        message (str): Text message
+
+    Returns:
+        dict: Requested settings, or None if the message is not a valid stream control request
+    """
+    prefix = f"{STREAM_CONTROL}."
+    if not message.startswith(prefix):
+        return None
+    try:
+        settings = json.loads(message[len(prefix):])
+    except ValueError:
+        return None
+    if not isinstance(settings, dict):
+        return None
+    return settings
+
+
+class StreamQualityController:
+    def __init__(self, ws_client, frame_processor, interval=1.0, max_drop_ratio=0.2, max_lag=3,
+                 upgrade_after=5, level=0):
+        """
+        Feedback controller asking the camera server for a cheaper or better stream
+        depending on how well the frame pipeline keeps up.
+
+        Every interval it looks at the fraction of frames received by the client that were
+        dropped along the way (by the client's overload policy, or by the processor for a
+        newer pair) or held back by pausing the socket, and at the processing lag: how many
+        frames the client has received since the pair behind the latest result. When either
+        is too high it steps one level down QUALITY_LEVELS; after upgrade_after calm
+        intervals in a row it steps one level back up.
+
+        Args:
+            ws_client (WebSocketClient): Client receiving the frames, also used to send the control messages
+            frame_processor (FrameProcessor): Pipeline whose results are watched
+            interval (float): Time in seconds between decisions
+            max_drop_ratio (float): Fraction of dropped frames that triggers a downgrade
+            max_lag (int): Processing lag in frames that triggers a downgrade
+            upgrade_after (int): Calm intervals needed before an upgrade
+            level (int): Starting index into QUALITY_LEVELS
+        """
+        self.ws_client = ws_client
+        self.frame_processor = frame_processor
+        self.interval = interval
+        self.max_drop_ratio = max_drop_ratio
+        self.max_lag = max_lag
+        self.upgrade_after = upgrade_after
+        self.level = level
+        self.calm_intervals = 0
+        self.running = False
+
+        self._last_received, self._last_dropped = self._counters()
+
+        # Resend the current settings whenever the connection comes back
+        self.ws_client.add_state_listener(self._on_connection_state)
+        self.ws_client.set_dedup_policy(STREAM_CONTROL, None)
+
+    @property
+    def settings(self):
+        """Currently requested (quality, scale, fps)"""
+        return QUALITY_LEVELS[self.level]
+
+    def _on_connection_state(self, state):
+        if state == 'connected':
+            self.request()
+
+    def request(self):
+        """Send the current settings to the camera server"""
+        quality, scale, fps = self.settings
+        try:
+            self.ws_client.send_queue.put_nowait((STREAM_CONTROL, format_stream_control(quality, scale, fps)))
+        except asyncio.QueueFull:
+            print("[-] Send queue full, stream control request skipped")
+            return
+        print(f"[i] Requesting stream quality {quality}, scale {scale}, {fps} fps")
+
+    def _counters(self):
+        """Frames received by the client so far, and frames dropped or held back on their way"""
+        stats = self.ws_client.frame_stats()
+        dropped = (stats['dropped_oldest'] + stats['dropped_newest'] + stats['paused']
+                   + self.frame_processor.dropped_frames)
+        return stats['received'], dropped
+
+    def update(self):
+        """
+        Make one decision from the counters collected since the previous call.
+
+        Returns:
+            bool: True if a new level was requested
+        """
+        total_received, total_dropped = self._counters()
+        received = total_received - self._last_received
+        dropped = total_dropped - self._last_dropped
+        self._last_received, self._last_dropped = total_received, total_dropped
+        if received == 0:
+            return False
+
+        if self.frame_processor.result_arrival is None:
+            lag = received
+        else:
+            lag = self.ws_client.frames_received_since(self.frame_processor.result_arrival)
+        overloaded = dropped / received > self.max_drop_ratio or lag > self.max_lag
+
+        if overloaded:
+            self.calm_intervals = 0
+            if self.level < len(QUALITY_LEVELS) - 1:
+                self.level += 1
+                self.request()
+                return True
+            return False
+
+        self.calm_intervals += 1
+        if self.calm_intervals >= self.upgrade_after and self.level > 0:
+            self.calm_intervals = 0
+            self.level -= 1
+            self.request()
+            return True
+        return False
+
+    async def run(self):
+        """Run the controller until stop() is called"""
+        self.running = True
+        while self.running:
+            await asyncio.sleep(self.interval)
+            self.update()
+
+    def stop(self):
+        self.running = False
@@ -1,11 +1,28 @@
 import asyncio
+import inspect
+import random
 import websockets
 import threading
 import queue
-import hashlib
+import time
+from collections import OrderedDict, deque
+from ws.acks import CommandTracker
+from ws.latency import pipeline_latency
+from ws.protocol import (MSG_ACK, MSG_TELEMETRY, ProtocolError, decode_message, encode_servo_command,
+                         format_text_command, is_protocol_message, parse_text_ack)
+
+# Connection states reported to state listeners
+CONNECTION_STATES = ('connecting', 'connected', 'disconnected', 'closed')
+
+# Frame overload policies: replace the waiting frame with the new one, drop the new one,
+# or stop reading from the socket until a frame callback finishes
+OVERLOAD_POLICIES = ('drop_oldest', 'drop_newest', 'pause')
 
 class WebSocketClient:
-    def __init__(self, uri, frame_callback=None, message_callback=None, max_queue_size=10, deduplication_timeout=5):
+    def __init__(self, uri, frame_callback=None, message_callback=None, max_queue_size=10, deduplication_timeout=5,
+                 reconnect_initial_delay=0.1, reconnect_max_delay=5.0, dedup_policy=None,
+                 protocol='text', telemetry_callback=None, max_inflight_frames=2, max_pending_frames=1,
+                 overload_policy='drop_oldest', ack_timeout=None, max_retries=1, escalation_callback=None):
         """
         A WebSocket client that handles frame data and messaging with thread support.
         
@@ -15,10 +32,44 @@ class WebSocketClient:
             message_callback (callable): Async function to call when text messages are received
             max_queue_size (int): Maximum size of the send queue
             deduplication_timeout (float): Time in seconds to remember sent messages for deduplication
+            reconnect_initial_delay (float): Backoff ceiling in seconds for the first reconnection attempt
+            reconnect_max_delay (float): Upper limit in seconds for the reconnection backoff
+            dedup_policy (dict): Maps message type to its deduplication timeout in seconds,
+                None disables deduplication for that type; other types use deduplication_timeout
+            protocol (str): Servo command encoding, 'binary' (ws.protocol) or 'text' for older firmware
+            telemetry_callback (callable): Called with a TELEMETRY_DTYPE record array for each telemetry message
+            max_inflight_frames (int): Maximum number of frame callbacks running at once
+            max_pending_frames (int): Frames kept waiting for a free slot before the overload policy drops one
+            overload_policy (str): What to do when frames arrive faster than they are handled, see OVERLOAD_POLICIES
+            ack_timeout (float): Time in seconds to wait for the robot to acknowledge a servo command,
+                None sends commands fire-and-forget without message ids
+            max_retries (int): How many times an unacknowledged command is resent
+            escalation_callback (callable): Called with (message_type, commands) when a command
+                is still unacknowledged after all retries
         """
+        if overload_policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy: {overload_policy}")
+        if protocol not in ('binary', 'text'):
+            raise ValueError(f"Unknown protocol: {protocol}")
         self.uri = uri
         self.frame_callback = frame_callback
         self.message_callback = message_callback
+        self.telemetry_callback = telemetry_callback
+        self.protocol = protocol
+        self.message_sequence = 0
+        
+        # Bounded frame handling
+        self.max_inflight_frames = max_inflight_frames
+        self.max_pending_frames = max_pending_frames
+        self.overload_policy = overload_policy
+        self.inflight_frames = set()
+        self.pending_frames = deque()
+        self.frame_done_event = asyncio.Event()
+        self.frames_received = 0
+        self.frame_times = deque(maxlen=256)  # Receive times of the most recent frames
+        self.frames_dropped_oldest = 0
+        self.frames_dropped_newest = 0
+        self.frames_paused = 0
         self.send_queue = asyncio.Queue(max_queue_size)
         self.websocket = None
         self.running = False
@@ -26,37 +77,74 @@ class WebSocketClient:
         # Create an event to signal when the connection is established
         self.connected_event = asyncio.Event()
         
+        # Connection supervision
+        self.state = 'disconnected'
+        self.state_listeners = []
+        self.stop_event = asyncio.Event()
+        self.reconnect_initial_delay = reconnect_initial_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnect_attempts = 0
+        self.unsent_message = None  # Message taken from the queue but not sent before the connection dropped
+        
+        # Latest target per (message type, servo id), sent in place of older unsent targets
+        self.latest_commands = OrderedDict()
+        self.command_event = asyncio.Event()
+        
+        # Acknowledgement tracking
+        self.command_tracker = CommandTracker(ack_timeout, max_retries) if ack_timeout else None
+        self.escalation_callback = escalation_callback
+        self.command_attempts = {}  # Retry number of targets put back into latest_commands
+        self.last_command_ids = {}  # Message id of the last send per (message type, servo id)
+        
         # Message deduplication system
-        self.message_cache = {}  # Maps message hash to timestamp
+        self.message_cache = {}  # Maps message type to an OrderedDict of message hash -> timestamp
         self.deduplication_timeout = deduplication_timeout
+        self.dedup_policy = {'close': None}  # Per-type timeout overrides, None disables deduplication
+        if dedup_policy:
+            self.dedup_policy.update(dedup_policy)
+    
+    def set_dedup_policy(self, message_type, timeout):
+        """
+        Set how long messages of a type are remembered for deduplication.
+        
+        Args:
+            message_type (str): Type of message
+            timeout (float): Time in seconds, None or 0 disables deduplication for the type
+        """
+        self.dedup_policy[message_type] = timeout
+        self.message_cache.pop(message_type, None)
     
     def _get_message_hash(self, message_type, data):
         """
         Generate a hash for a message to detect duplicates.
         
+        Uses Python's built-in (non-cryptographic) hash, messages are only compared
+        within one process run.
+        
         Args:
             message_type (str): Type of message ('msg', 'img', etc.)
             data (bytes): Message content
             
         Returns:
-            str: Hash representation of the message
+            int: Hash of the message
         """
-        # For binary data, create a hash of the content
         if message_type == 'img':
-            # For images, we might only want to hash a small portion or metadata
-            # to avoid performance issues with large frames
-            return hashlib.md5(data[:1024]).hexdigest()  # Hash first 1KB for performance
-        elif message_type == 'msg':
-            # For text messages, hash the entire content
-            return hashlib.md5(data).hexdigest()
-        else:
-            # For other types, combine type and a hash of the data
-            return f"{message_type}_{hashlib.md5(str(data).encode()).hexdigest()}"
+            # For images, only hash the first 1KB to avoid performance issues with large frames
+            return hash(bytes(data[:1024]))
+        try:
+            return hash(data)
+        except TypeError:
+            # Unhashable payloads (e.g. lists) are hashed by their text form
+            return hash(str(data))
     
     def _is_duplicate_message(self, message_type, data):
         """
         Check if a message is a duplicate of a recently sent message.
         
+        Each message type has its own insertion-ordered cache. Entries of a type share
+        one timeout, so insertion order is expiry order and expired entries are evicted
+        from the front, which is amortised O(1) per message.
+        
         Args:
             message_type (str): Type of message
             data (bytes): Message content
@@ -64,8 +152,9 @@ class WebSocketClient:
         Returns:
             bool: True if message is a duplicate, False otherwise
         """
-        # Skip deduplication for certain message types
-        if message_type == 'close':
+        # Skip deduplication for types without a timeout
+        timeout = self.dedup_policy.get(message_type, self.deduplication_timeout)
+        if not timeout:
             return False
         
         # Calculate message hash
@@ -74,54 +163,120 @@ class WebSocketClient:
         # Get current time
         current_time = asyncio.get_event_loop().time()
         
-        # Clean expired entries from the cache
-        expired_hashes = []
-        for hash_key, timestamp in self.message_cache.items():
-            if current_time - timestamp > self.deduplication_timeout:
-                expired_hashes.append(hash_key)
-        
-        for hash_key in expired_hashes:
-            del self.message_cache[hash_key]
+        # Evict expired entries from the front of the cache
+        cache = self.message_cache.get(message_type)
+        if cache is None:
+            cache = self.message_cache[message_type] = OrderedDict()
+        while cache:
+            timestamp = next(iter(cache.values()))
+            if current_time - timestamp <= timeout:
+                break
+            cache.popitem(last=False)
         
         # Check if this is a duplicate message
-        if msg_hash in self.message_cache:
+        if msg_hash in cache:
             return True
         
         # Not a duplicate, add to cache
-        self.message_cache[msg_hash] = current_time
+        cache[msg_hash] = current_time
         return False
     
+    def add_state_listener(self, listener):
+        """
+        Register a callable notified about connection state changes.
+        
+        Args:
+            listener (callable): Called with the new state, one of CONNECTION_STATES
+        """
+        self.state_listeners.append(listener)
+    
+    def _set_state(self, state):
+        """Update the connection state and notify listeners"""
+        if state == self.state:
+            return
+        self.state = state
+        for listener in self.state_listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                print(f"[-] Error in connection state listener: {e}")
+    
+    def _backoff_delay(self):
+        """Jittered exponential backoff delay for the next reconnection attempt"""
+        ceiling = min(self.reconnect_max_delay, self.reconnect_initial_delay * (2 ** self.reconnect_attempts))
+        self.reconnect_attempts += 1
+        return random.uniform(ceiling / 2, ceiling)
+    
     async def connect(self):
         """Establish WebSocket connection and start handler tasks"""
+        self._set_state('connecting')
         try:
             self.websocket = await websockets.connect(self.uri)
             self.running = True
+            self.reconnect_attempts = 0
             self.connected_event.set()  # Signal that connection is established
+            self._set_state('connected')
             print(f"[+] Connected to WebSocket server at {self.uri}")
             return True
         except Exception as e:
             print(f"[-] Connection error: {e}")
+            self._set_state('disconnected')
             return False
     
+    def is_open(self):
+        """
+        Check whether the connection can send and receive.
+        
+        Works with both the legacy websockets API (which has .open) and the newer one
+        (which only has .state): both expose .state as an enum with an OPEN member.
+        """
+        return self.websocket is not None and self.websocket.state.name == 'OPEN'
+    
     async def disconnect(self):
-        """Close the WebSocket connection gracefully"""
+        """Close the WebSocket connection gracefully and stop reconnecting"""
+        self.running = False
+        self.stop_event.set()
         if self.websocket:
             await self.send_queue.put(('close', None))
-            self.running = False
     
     async def run(self):
-        """Run the WebSocket client tasks"""
-        if not self.websocket:
-            success = await self.connect()
-            if not success:
-                return
-        
-        # Start tasks for receiving and sending data
-        receive_task = asyncio.create_task(self.receive_loop())
-        send_task = asyncio.create_task(self.send_loop())
+        """Run the WebSocket client tasks, reconnecting with backoff whenever the connection drops"""
+        self.running = True
+        self.stop_event.clear()
+        ack_task = asyncio.create_task(self._ack_monitor()) if self.command_tracker else None
+        while self.running:
+            if await self.connect():
+                # Start tasks for receiving and sending data
+                receive_task = asyncio.create_task(self.receive_loop())
+                send_task = asyncio.create_task(self.send_loop())
+                
+                # Either loop ending means the connection is gone (or we are closing)
+                done, pending = await asyncio.wait({receive_task, send_task}, return_when=asyncio.FIRST_COMPLETED)
+                if self.is_open():
+                    await self.websocket.close()
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                
+                self.connected_event.clear()
+                self._set_state('disconnected')
+            
+            if not self.running:
+                break
+            
+            # Wait before reconnecting, unless asked to stop in the meantime
+            delay = self._backoff_delay()
+            print(f"[i] Reconnecting to {self.uri} in {delay:.2f} s")
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
         
-        # Wait for all tasks to complete
-        await asyncio.gather(receive_task, send_task)
+        if ack_task:
+            ack_task.cancel()
+            await asyncio.gather(ack_task, return_exceptions=True)
+        self.connected_event.clear()
+        self._set_state('closed')
     
     async def receive_loop(self):
         """Handle incoming WebSocket messages"""
@@ -134,60 +289,310 @@ class WebSocketClient:
                     if data == 'close':
                         await self.disconnect()
                         break
+                    if self.command_tracker:
+                        message_id = parse_text_ack(data)
+                        if message_id is not None:
+                            self.command_tracker.acknowledge(message_id)
+                            continue
                     # Handle text message
                     if self.message_callback:
-                        asyncio.create_task(self.message_callback(data))
+                        result = self.message_callback(data)
+                        if inspect.isawaitable(result):
+                            asyncio.create_task(result)
+                elif is_protocol_message(data):
+                    self._handle_protocol_message(data)
                 else:
                     # Handle binary frame data - don't block the receive loop
                     if self.frame_callback:
-                        asyncio.create_task(self.frame_callback(data))
+                        # recv() returns the complete message, network time is not included
+                        t_received = time.perf_counter()
+                        if self.overload_policy == 'pause':
+                            # Stop reading until a frame finishes, TCP backpressure slows the server
+                            await self._wait_for_frame_slot()
+                        self._dispatch_frame(data, t_received)
         
         except websockets.exceptions.ConnectionClosed:
             print("[-] Connection closed by server")
         except Exception as e:
             print(f"[-] Error in receive loop: {e}")
-        finally:
-            self.running = False
-            self.connected_event.clear()
+    
+    def _handle_protocol_message(self, data):
+        """Decode a binary protocol message (telemetry, acknowledgements) and pass it on"""
+        try:
+            message_id, sequence, records = decode_message(data)
+        except ProtocolError as e:
+            print(f"[-] Bad protocol message: {e}")
+            return
+        if message_id == MSG_TELEMETRY and self.telemetry_callback:
+            self.telemetry_callback(records)
+        elif message_id == MSG_ACK and self.command_tracker:
+            for acked in records['sequence'].tolist():
+                self.command_tracker.acknowledge(acked)
+    
+    def _dispatch_frame(self, data, t_received):
+        """Start a frame callback if below the in-flight limit, otherwise apply the overload policy"""
+        self.frames_received += 1
+        self.frame_times.append(t_received)
+        if len(self.inflight_frames) < self.max_inflight_frames:
+            self._start_frame(data, t_received)
+            return
+        if len(self.pending_frames) >= self.max_pending_frames:
+            if self.overload_policy == 'drop_newest':
+                self.frames_dropped_newest += 1
+                return
+            # drop_oldest: the waiting frame is stale, replace it
+            self.pending_frames.popleft()
+            self.frames_dropped_oldest += 1
+        self.pending_frames.append((data, t_received))
+    
+    def _start_frame(self, data, t_received):
+        task = asyncio.create_task(self._handle_frame(data, t_received))
+        self.inflight_frames.add(task)
+        task.add_done_callback(self._frame_done)
+    
+    def _frame_done(self, task):
+        """Release the in-flight slot of a finished frame callback and start a waiting frame"""
+        self.inflight_frames.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"[-] Error in frame callback: {task.exception()}")
+        if self.pending_frames and len(self.inflight_frames) < self.max_inflight_frames:
+            self._start_frame(*self.pending_frames.popleft())
+        self.frame_done_event.set()
+    
+    async def _wait_for_frame_slot(self):
+        """Wait until fewer than max_inflight_frames frame callbacks are running"""
+        if len(self.inflight_frames) < self.max_inflight_frames:
+            return
+        self.frames_paused += 1
+        while len(self.inflight_frames) >= self.max_inflight_frames:
+            self.frame_done_event.clear()
+            await self.frame_done_event.wait()
+    
+    def frame_stats(self):
+        """
+        Get frame handling counters.
+        
+        Returns:
+            dict: Frames received, in-flight and waiting frames, frames dropped by each policy
+                and times reading was paused
+        """
+        return {
+            'received': self.frames_received,
+            'inflight': len(self.inflight_frames),
+            'pending': len(self.pending_frames),
+            'dropped_oldest': self.frames_dropped_oldest,
+            'dropped_newest': self.frames_dropped_newest,
+            'paused': self.frames_paused,
+        }
+    
+    def frames_received_since(self, timestamp):
+        """
+        Count the frames received after a time.perf_counter() timestamp.
+        
+        Only the receive times of the most recent frames are kept, so the count saturates
+        at frame_times.maxlen.
+        """
+        count = 0
+        for t_received in reversed(self.frame_times):
+            if t_received <= timestamp:
+                break
+            count += 1
+        return count
+    
+    async def _handle_frame(self, data, t_received):
+        """Pass frame data to the frame callback, timing how long it waited to be dispatched"""
+        pipeline_latency.record("dispatch_wait", time.perf_counter() - t_received)
+        await self.frame_callback(data)
+    
+    def send_servo_command(self, message_type, servo_id, *values):
+        """
+        Set the latest target for a servo. A newer command for the same servo replaces
+        an older one that hasn't been sent yet, so the robot only gets the current target.
+        
+        Args:
+            message_type (str): Type of message ('msg-servo-9g', 'msg-servo-st')
+            servo_id (int): Servo the command is for (pin number for 9g servos)
+            *values: Target values, (position,) for ST servos, (angle, step_delay, step_size) for 9g servos
+        """
+        self.latest_commands[(message_type, servo_id)] = values
+        self.command_attempts.pop((message_type, servo_id), None)
+        self.command_event.set()
+    
+    def _take_servo_commands(self):
+        """
+        Take pending servo targets. With the binary protocol every pending target of the
+        oldest message type is taken, so one frame carries all joints.
+        
+        Returns:
+            tuple: (message_type, commands) with commands mapping servo id to target values
+        """
+        (message_type, servo_id), values = self.latest_commands.popitem(last=False)
+        commands = {servo_id: values}
+        if self.protocol == 'binary':
+            for key in [key for key in self.latest_commands if key[0] == message_type]:
+                commands[key[1]] = self.latest_commands.pop(key)
+        return message_type, commands
+    
+    async def _next_message(self):
+        """
+        Wait for the next message to send. One-shot messages from send_queue keep
+        their FIFO order and go first, then the latest per-servo targets.
+        
+        Returns:
+            tuple: (message_type, data, coalesced), coalesced is True when data holds
+                servo targets taken from the latest-value slots
+        """
+        while True:
+            if not self.send_queue.empty():
+                message_type, data , = self.send_queue.get_nowait()
+                self.send_queue.task_done()
+                return message_type, data, False
+            if self.latest_commands:
+                return (*self._take_servo_commands(), True)
+            
+            # Nothing pending, wait for either kind of message
+            self.command_event.clear()
+            queue_task = asyncio.ensure_future(self.send_queue.get())
+            command_task = asyncio.ensure_future(self.command_event.wait())
+            try:
+                await asyncio.wait({queue_task, command_task}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                command_task.cancel()
+                if not queue_task.done():
+                    queue_task.cancel()
+            if queue_task.done() and not queue_task.cancelled():
+                message_type, data , = queue_task.result()
+                self.send_queue.task_done()
+                return message_type, data, False
+    
+    def _next_message_id(self):
+        self.message_sequence = (self.message_sequence + 1) & 0xFFFF
+        return self.message_sequence
+    
+    def _track_command(self, message_id, message_type, commands):
+        """Start waiting for the acknowledgement of sent servo targets"""
+        attempt = max(self.command_attempts.pop((message_type, servo_id), 0) for servo_id in commands)
+        for servo_id in commands:
+            self.last_command_ids[(message_type, servo_id)] = message_id
+        self.command_tracker.track(message_id, message_type, commands, attempt)
+    
+    async def _send_servo_commands(self, message_type, commands):
+        """Send coalesced servo targets, as one binary frame or one text message per servo"""
+        if self.protocol == 'binary':
+            message_id = self._next_message_id()
+            if self.command_tracker:
+                self._track_command(message_id, message_type, commands)
+            await self.websocket.send(encode_servo_command(message_type, commands, message_id))
+        else:
+            for servo_id in list(commands):
+                message_id = None
+                if self.command_tracker:
+                    message_id = self._next_message_id()
+                    self._track_command(message_id, message_type, {servo_id: commands[servo_id]})
+                await self.websocket.send(format_text_command(message_type, servo_id, commands[servo_id], message_id))
+                # Drop it right away so a reconnect only resends what is left
+                del commands[servo_id]
+    
+    def _retry_command(self, message_id, message_type, commands, attempt):
+        """
+        Put unacknowledged targets back into the latest-value slots, unless a newer target
+        for the servo is pending or was sent after them.
+        """
+        for servo_id, values in commands.items():
+            key = (message_type, servo_id)
+            if key in self.latest_commands or self.last_command_ids.get(key) != message_id:
+                continue
+            self.latest_commands[key] = values
+            self.command_attempts[key] = attempt + 1
+        self.command_event.set()
+    
+    def _escalate_command(self, message_type, commands):
+        """Report targets the robot never acknowledged"""
+        if self.escalation_callback:
+            try:
+                self.escalation_callback(message_type, commands)
+            except Exception as e:
+                print(f"[-] Error in escalation callback: {e}")
+        else:
+            print(f"[!] {message_type} not acknowledged for servos {sorted(commands)}")
+    
+    async def _ack_monitor(self):
+        """Resend or escalate servo commands whose acknowledgement is overdue"""
+        interval = self.command_tracker.timeout / 4
+        while True:
+            await asyncio.sleep(interval)
+            retry, escalate = self.command_tracker.expire()
+            for message_id, message_type, commands, attempt in retry:
+                self._retry_command(message_id, message_type, commands, attempt)
+            for message_id, message_type, commands, attempt in escalate:
+                self._escalate_command(message_type, commands)
+    
+    def command_stats(self):
+        """
+        Get servo command acknowledgement statistics.
+        
+        Returns:
+            dict: See CommandTracker.stats, None if acknowledgements are not tracked
+        """
+        return self.command_tracker.stats() if self.command_tracker else None
     
     async def send_loop(self):
-        """Send queued messages to the WebSocket server"""
+        """
+        Send queued messages to the WebSocket server.
+        
+        A message that could not be sent because the connection dropped is kept and
+        sent first once the connection is re-established.
+        """
         try:
-            while self.running:
-                message_type, data , = await self.send_queue.get()
-                
-                # Check if this is a duplicate message
-                if self._is_duplicate_message(message_type, data):
-                    print(f"[i] Skipping duplicate message of type: {message_type}")
-                    self.send_queue.task_done()
-                    continue
+            while True:
+                if self.unsent_message:
+                    message_type, data, coalesced = self.unsent_message
+                    if coalesced:
+                        # A newer target for the same servo supersedes the unsent one
+                        data = {servo_id: values for servo_id, values in data.items()
+                                if (message_type, servo_id) not in self.latest_commands}
+                        if not data:
+                            self.unsent_message = None
+                            continue
+                else:
+                    message_type, data, coalesced = await self._next_message()
+                    
+                    # Check if this is a duplicate message, latest-value commands are already coalesced
+                    if not coalesced and self._is_duplicate_message(message_type, data):
+                        print(f"[i] Skipping duplicate message of type: {message_type}")
+                        continue
                 
                 if message_type == 'close':
-                    if self.websocket and self.websocket.open:
+                    self.unsent_message = None
+                    if self.is_open():
                         await self.websocket.close()
                     break
+                
+                if not self.is_open():
+                    # Keep the message for the next connection
+                    self.unsent_message = (message_type, data, coalesced)
+                    break
+                
+                self.unsent_message = (message_type, data, coalesced)
+                if coalesced:
+                    await self._send_servo_commands(message_type, data)
                 elif message_type == 'msg-servo-st':
-                    if self.websocket and self.websocket.open:
-                        await self.websocket.send(f"{message_type}.{data}")
+                    await self.websocket.send(f"{message_type}.{data}")
                 elif message_type == 'msg-servo-9g':
-                    if self.websocket and self.websocket.open:
-                        print(data)
-                        await self.websocket.send(f"{message_type}.{data}")
+                    print(data)
+                    await self.websocket.send(f"{message_type}.{data}")
+                elif message_type == 'stream-control':
+                    await self.websocket.send(f"{message_type}.{data}")
                 elif message_type == 'img':
-                    if self.websocket and self.websocket.open:
-                        await self.websocket.send(data)
+                    await self.websocket.send(data)
                 else:
                     print(f"[-] Unknown message type: {message_type}")
-                
-                self.send_queue.task_done()
+                self.unsent_message = None
         
         except websockets.exceptions.ConnectionClosed:
             print("[-] Connection closed while sending")
         except Exception as e:
             print(f"[-] Error in send loop: {e}")
-        finally:
-            self.running = False
-            self.connected_event.clear()
     
     async def send_message(self, message):
         """Queue a text message to be sent"""